@@ -0,0 +1,4 @@
+from .benchmark_suite import Benchmark_Suite
+from .engine_check import Engine_Check
+
+__all__ = ["Benchmark_Suite", "Engine_Check"]
\ No newline at end of file
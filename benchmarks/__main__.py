@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This is the __main__.py file of the benchmarks package that times the
+construction of the root system, its export and the build of the web page.
+
+The command run (the default) runs the benchmarks (see Benchmark_Suite)
+and appends the results to benchmarks/history.jsonl. The option --cases
+selects some of the benchmarks, --repeat sets the number of repetitions
+and --label attaches a label to the run. It exits with status 1 if a
+benchmark failed.
+The command compare compares the last two runs of the history, or the runs
+given by --baseline and --current, and exits with status 1 if a time or
+the memory increased by more than --threshold, an output changed or a
+benchmark failed. Times that increased by less than --min-seconds are
+within the noise.
+The command list prints the names of all benchmarks.
+The command check constructs the root system up to --height with every
+engine, storage mode, enumeration and use of the closed forms and compares
+the tables with data/roots.txt (see Engine_Check). It exits with status 1
+if any table differs.
+Every change of an engine or a storage mode of the rootsystem package is
+run against the check and the benchmarks before and after the change.
+"""
+
+import argparse
+import sys
+from .benchmark_suite import Benchmark_Suite
+from .engine_check import Engine_Check
+
+
+def _parse_argument():
+        """Parse the command and the options of the benchmarks."""
+        
+        _parser = argparse.ArgumentParser(description="Run and compare the benchmarks.")
+        _parser.add_argument("command", nargs="?", choices=("run", "compare", "list", "check"), default="run",
+                             help="Run the benchmarks, compare two runs, list the benchmarks or check the engines.")
+        _parser.add_argument("--history", metavar="FILE", default=None,
+                             help="The JSON lines file of the runs.")
+        _parser.add_argument("--cases", metavar="NAME", nargs="+", default=None,
+                             help="The benchmarks to run, by default all of them.")
+        _parser.add_argument("--repeat", metavar="N", default=3, type=int,
+                             help="The number of repetitions of every benchmark.")
+        _parser.add_argument("--label", default=None,
+                             help="A label of the run.")
+        _parser.add_argument("--baseline", metavar="INDEX", default=-2, type=int,
+                             help="The index of the baseline run in the history.")
+        _parser.add_argument("--current", metavar="INDEX", default=-1, type=int,
+                             help="The index of the compared run in the history.")
+        _parser.add_argument("--threshold", default=0.2, type=float,
+                             help="The relative increase that counts as a regression.")
+        _parser.add_argument("--min-seconds", metavar="SECONDS", default=0.1, type=float,
+                             help="The smallest increase of a time that counts as a regression.")
+        _parser.add_argument("--height", default=40, type=int,
+                             help="The height up to which the check constructs the root systems.")
+        
+        return _parser.parse_args()
+
+
+def main():
+        """Run the command of the benchmarks."""
+        
+        _arguments = _parse_argument()
+        _suite = Benchmark_Suite(_arguments.history, repeat=_arguments.repeat)
+        
+        if _arguments.command == "check":
+                _failures = Engine_Check(_arguments.height).run()
+                print(str(len(Engine_Check.settings()) - len(_failures)) + " of "
+                      + str(len(Engine_Check.settings())) + " settings match data/roots.txt")
+                if _failures:
+                        sys.exit(1)
+        elif _arguments.command == "list":
+                print("\n".join(_suite.names()))
+        elif _arguments.command == "run":
+                _run = _suite.run(_arguments.cases, label=_arguments.label)
+                if any("error" in result for result in _run["results"].values()):
+                        sys.exit(1)
+        elif not _suite.print_comparison(_arguments.baseline, _arguments.current, _arguments.threshold,
+                                         _arguments.min_seconds):
+                sys.exit(1)
+        
+
+if __name__ == "__main__":
+        main()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the benchmarks package that times the construction
+of the root system, its export and the build of the web page.
+
+This class runs the benchmarks with fixed parameters, keeps their results
+in a history file and compares the runs of the history.
+"""
+
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+# The directory of VisualLie, from which all benchmarks are run
+_ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Every benchmark is a function that prepares the benchmark outside of the
+# measurement and returns the function that is measured. The measured
+# function returns the size of the output.
+
+
+def _construct(height, engine="join", storage="objects"):
+    """Return a function that constructs the root system up to a height and returns the number of stored roots."""
+    from rootsystem import Feingold_Frenkel_Algebra, Root_System
+
+    def _run():
+        _root_system = Root_System(Feingold_Frenkel_Algebra(closed_form_height=height), engine=engine, storage=storage)
+        _root_system.construct(height)
+        return sum(len(_root_system.root_system[h]) for h in range(1, _root_system.constructed_height() + 1))
+
+    return _run
+
+
+def _write(height, binary=False):
+    """Construct the root system up to a height and return a function that writes it and returns the size of the file."""
+    from rootsystem import Feingold_Frenkel_Algebra, Root_System
+
+    _root_system = Root_System(Feingold_Frenkel_Algebra(closed_form_height=height))
+    _root_system.construct(height)
+
+    def _run():
+        with tempfile.TemporaryDirectory() as directory:
+            _file = os.path.join(directory, "roots.bin" if binary else "roots.txt")
+            if binary:
+                _root_system.write_store(_file)
+            else:
+                _root_system.write_txt_file(_file)
+            return os.path.getsize(_file)
+
+    return _run
+
+
+def _plot_2d(max_depth, max_level):
+    """Return a function that makes the 2D plot and returns the size of its html."""
+    from plots.plot_2d import make_2d_plot
+    return lambda: len(make_2d_plot(max_depth, max_level))
+
+
+def _plot_3d(max_depth, max_level):
+    """Return a function that makes the 3D plot and returns the size of its html."""
+    from plots.plot_3d import make_3d_plot
+    return lambda: len(make_3d_plot(max_depth, max_level))
+
+
+def _render():
+    """Return a function that builds the web page and returns the size of index.html."""
+    return _render_copy
+
+
+def _render_copy():
+    """Build the web page with VisualLie.py in a copy of the sources and return the size of index.html."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ("plots", "models", "templates", "rootsystem"):
+            shutil.copytree(os.path.join(_ROOT_DIRECTORY, name), os.path.join(directory, name),
+                            ignore=shutil.ignore_patterns("__pycache__"))
+        os.makedirs(os.path.join(directory, "data"))
+        os.makedirs(os.path.join(directory, "docs"))
+        for name in ("roots.txt", "roots.bin"):
+            if os.path.exists(os.path.join(_ROOT_DIRECTORY, "data", name)):
+                shutil.copy(os.path.join(_ROOT_DIRECTORY, "data", name), os.path.join(directory, "data", name))
+        shutil.copy(os.path.join(_ROOT_DIRECTORY, "VisualLie.py"), directory)
+
+        subprocess.run([sys.executable, "VisualLie.py"], cwd=directory, check=True,
+                       stdout=subprocess.DEVNULL)
+        return os.path.getsize(os.path.join(directory, "docs", "index.html"))
+
+
+def _cases():
+    """Return the benchmarks as a dictionary from their names to a function and its arguments."""
+
+    from rootsystem import Root_System
+
+    _cases = {}
+    for height in (40, 60, 76):
+        _cases["construct_h" + str(height)] = (_construct, (height,))
+    for engine in Root_System.ENGINES:
+        for storage in Root_System.STORAGES:
+            _cases["construct_" + engine + "_" + storage + "_h40"] = (_construct, (40, engine, storage))
+    _cases["write_txt_h60"] = (_write, (60,))
+    _cases["write_store_h60"] = (_write, (60, True))
+    for max_depth, max_level in ((30, 5), (60, 10), (100, 20)):
+        _cases["plot_2d_d" + str(max_depth) + "_l" + str(max_level)] = (_plot_2d, (max_depth, max_level))
+    _cases["plot_3d_d16_l19"] = (_plot_3d, (16, 19))
+    _cases["render"] = (_render, ())
+
+    return _cases
+
+
+def _peak_memory(who):
+    """Return the peak resident memory of the process or its children in MB."""
+    _peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return _peak / 2**20 if sys.platform == "darwin" else _peak / 2**10
+
+
+def _reset_peak_memory():
+    """
+    Reset the peak resident memory of the process, such that the memory
+    of the preparation is not counted. Returns False if the system can
+    not reset it, which is only possible on Linux.
+    """
+
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _measured_peak_memory():
+    """Return the peak resident memory of the process since the last reset in MB."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 2**10
+    return _peak_memory(resource.RUSAGE_SELF)
+
+
+def _run_case(name, results):
+    """
+    Run one benchmark in a new process and put its measurements into a queue.
+    If the benchmark raises an error, its traceback is put into the queue instead.
+    """
+
+    try:
+        os.chdir(_ROOT_DIRECTORY)
+        sys.path.insert(0, _ROOT_DIRECTORY)
+
+        _function, _arguments = _cases()[name]
+        _run = _function(*_arguments)
+        _reset = _reset_peak_memory()
+
+        _start = time.perf_counter()
+        _output = _run()
+        _seconds = time.perf_counter() - _start
+
+        # The children of the process only run during the measurement
+        _memory = _measured_peak_memory() if _reset else _peak_memory(resource.RUSAGE_SELF)
+        _memory = max(_memory, _peak_memory(resource.RUSAGE_CHILDREN))
+        results.put({"seconds": _seconds, "memory_mb": _memory, "output": _output,
+                     "memory_scope": "measurement" if _reset else "process"})
+    except Exception:
+        results.put({"error": traceback.format_exc()})
+
+
+def _receive(process, results):
+    """
+    Wait for the measurements of a benchmark process. Returns an error
+    if the process ends without putting anything into the queue, e.g.
+    because it crashed.
+    """
+
+    while True:
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                break
+
+    # The process may have put its result just before it ended
+    try:
+        return results.get(timeout=1)
+    except queue.Empty:
+        return {"error": "The benchmark process ended with exit code " + str(process.exitcode)
+                         + " without a result.\n"}
+
+
+class Benchmark_Suite:
+    """
+    The benchmarks of VisualLie with fixed parameters:
+        construct_hH: Root_System.construct up to the heights 40, 60 and 76
+                      with the default settings
+        construct_E_S_h40: Root_System.construct up to height 40 with every
+                           engine E and storage mode S
+        write_txt_h60, write_store_h60: Writing the roots up to height 60
+                                        as text and as a Root_Store
+        plot_2d_dD_lL: make_2d_plot up to depth D and level L
+        plot_3d_d16_l19: make_3d_plot with the parameters of the web page
+        render: Building the web page with VisualLie.py
+    Every benchmark runs in a new process, which records the time, the
+    peak resident memory of the process and its children and the size of
+    the output, i.e. the number of stored roots, the size of the file or
+    the length of the html. The imports and the construction before an
+    export are not measured. On Linux the peak memory is reset after the
+    preparation, so it is the peak during the measurement, which still
+    includes the memory that the preparation keeps, e.g. the constructed
+    root system of an export. On other systems it is the peak of the whole
+    process including the preparation, which memory_scope records. With
+    several repetitions the smallest time and memory are kept.
+
+    A benchmark that raises an error or whose process crashes is recorded
+    as failed with the traceback of the error instead of its measurements.
+
+    A run is appended to the history file as one line of JSON. Runs are
+    compared by their times and memory, where an increase beyond a
+    threshold is a regression. A different output means that the results
+    changed, which is always reported. A benchmark that failed in the
+    compared run counts as a regression.
+
+    Attributes:
+        history_file_path_and_name: The JSON lines file of the runs
+        repeat: The number of repetitions of every benchmark
+    """
+
+
+    def __init__(self, history_file_path_and_name=None, repeat=3):
+        """
+        Initialize a new suite.
+
+        Keyword arguments:
+            history_file_path_and_name: The JSON lines file of the runs,
+                                        by default benchmarks/history.jsonl
+            repeat: The number of repetitions of every benchmark
+        """
+
+        if history_file_path_and_name is None:
+            history_file_path_and_name = os.path.join(_ROOT_DIRECTORY, "benchmarks", "history.jsonl")
+        self.history_file_path_and_name = history_file_path_and_name
+        self.repeat = repeat
+
+
+    @staticmethod
+    def names():
+        """Return the names of all benchmarks."""
+        return list(_cases())
+
+
+    def run(self, names=None, label=None):
+        """
+        Run benchmarks and append the run to the history. Returns the run,
+        whose results contain the key "error" for every failed benchmark.
+
+        Keyword arguments:
+            names: The names of the benchmarks, by default all of them
+            label: An optional label of the run, e.g. the change it measures
+        """
+
+        if names is None:
+            names = self.names()
+        _unknown = [name for name in names if name not in self.names()]
+        if _unknown:
+            raise ValueError("Unknown benchmarks: " + ", ".join(_unknown))
+
+        _context = multiprocessing.get_context("spawn")
+        _results = {}
+        for name in names:
+            _measurements = []
+            for _ in range(self.repeat):
+                _queue = _context.Queue()
+                _process = _context.Process(target=_run_case, args=(name, _queue))
+                _process.start()
+                _measurements.append(_receive(_process, _queue))
+                _process.join()
+                if "error" in _measurements[-1]:
+                    break
+
+            if "error" in _measurements[-1]:
+                _results[name] = {"error": _measurements[-1]["error"]}
+                print(name + ": FAILED\n" + _results[name]["error"], end="")
+                continue
+
+            _results[name] = {"seconds": min(result["seconds"] for result in _measurements),
+                              "memory_mb": min(result["memory_mb"] for result in _measurements),
+                              "memory_scope": _measurements[-1]["memory_scope"],
+                              "output": _measurements[-1]["output"]}
+            print(name + ": " + str(round(_results[name]["seconds"], 3)) + " s, "
+                  + str(round(_results[name]["memory_mb"], 1)) + " MB, output " + str(_results[name]["output"]))
+
+        _run = {"date": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": self._commit(), "label": label,
+                "python": sys.version.split()[0], "results": _results}
+        with open(self.history_file_path_and_name, "a") as f:
+            f.write(json.dumps(_run) + "\n")
+
+        return _run
+
+
+    def history(self):
+        """Return all runs of the history file, the oldest first."""
+
+        if not os.path.exists(self.history_file_path_and_name):
+            return []
+        with open(self.history_file_path_and_name) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+    def compare(self, baseline=-2, current=-1, threshold=0.2, min_seconds=0.1):
+        """
+        Compare two runs of the history. Returns a list with one dictionary
+        per benchmark of both runs, which contains the relative changes of
+        the time and the memory and whether they are a regression.
+
+        Keyword arguments:
+            baseline: The index of the baseline run in the history
+            current: The index of the compared run in the history
+            threshold: The relative increase of the time or the memory
+                       that counts as a regression
+            min_seconds: The smallest increase of a time that counts as a
+                         regression, below it the times are within the noise
+        """
+
+        _history = self.history()
+        if len(_history) < 2:
+            raise ValueError("The history needs at least two runs to compare.")
+        _baseline, _current = _history[baseline]["results"], _history[current]["results"]
+
+        _comparison = []
+        for name in _current:
+            if name not in _baseline or "error" in _baseline[name]:
+                continue
+            if "error" in _current[name]:
+                _comparison.append({"name": name, "time_change": None, "memory_change": None,
+                                    "output_changed": False, "failed": True, "regression": True})
+                continue
+            _seconds = _current[name]["seconds"] - _baseline[name]["seconds"]
+            _time = _current[name]["seconds"] / max(_baseline[name]["seconds"], 1e-9) - 1
+            _memory = _current[name]["memory_mb"] / max(_baseline[name]["memory_mb"], 1e-9) - 1
+            # The memory of runs that measured different scopes can not be compared
+            if _current[name].get("memory_scope", "process") != _baseline[name].get("memory_scope", "process"):
+                _memory = 0.0
+            _comparison.append({"name": name, "time_change": _time, "memory_change": _memory,
+                                "output_changed": _current[name]["output"] != _baseline[name]["output"],
+                                "failed": False,
+                                "regression": (_time > threshold and _seconds > min_seconds) or _memory > threshold})
+
+        return _comparison
+
+
+    def print_comparison(self, baseline=-2, current=-1, threshold=0.2, min_seconds=0.1):
+        """
+        Print the comparison of two runs as a table and flag the regressions.
+        Returns True if there is no regression and no output changed.
+        """
+
+        _comparison = self.compare(baseline, current, threshold, min_seconds)
+        print("benchmark,time_change,memory_change,status")
+        for entry in _comparison:
+            if entry["failed"]:
+                print(entry["name"] + ",,,FAILED")
+                continue
+            _status = "ok"
+            if entry["regression"]:
+                _status = "REGRESSION"
+            if entry["output_changed"]:
+                _status += " OUTPUT CHANGED"
+            print(",".join([entry["name"], str(round(100 * entry["time_change"], 1)) + "%",
+                            str(round(100 * entry["memory_change"], 1)) + "%", _status]))
+
+        return not any(entry["regression"] or entry["output_changed"] for entry in _comparison)
+
+
+    @staticmethod
+    def _commit():
+        """Return the git commit of the sources, or None outside of a git repository."""
+        try:
+            return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_ROOT_DIRECTORY,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
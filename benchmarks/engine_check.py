@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the benchmarks package that times the construction
+of the root system, its export and the build of the web page.
+
+This class checks that every engine and storage mode of the rootsystem
+package constructs the same root table as the reference table.
+"""
+
+import itertools
+import os
+import time
+from rootsystem import Feingold_Frenkel_Algebra, Root_Catalog, Root_System
+
+# The directory of VisualLie, which holds the reference table
+_ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Engine_Check:
+    """
+    A regression check of the settings of Root_System.
+
+    The root system of the Feingold-Frenkel algebra is constructed up to a
+    height with every combination of an engine, a storage mode, the strings
+    or the lattice enumeration and the closed forms on or off. Each table
+    is compared with the rows of the reference table up to that height.
+    A setting fails if it misses a root, has a root that the reference
+    does not have, has a different multiplicity or raises an error.
+
+    Attributes:
+        height: The height up to which the root systems are constructed
+        reference_file_path_and_name: The reference table, by default
+                                      data/roots.txt
+    """
+
+
+    def __init__(self, height=40, reference_file_path_and_name=None):
+        """
+        Initialize a new check.
+
+        Keyword arguments:
+            height: The height up to which the root systems are constructed
+            reference_file_path_and_name: The reference table, by default data/roots.txt
+        """
+
+        if reference_file_path_and_name is None:
+            reference_file_path_and_name = os.path.join(_ROOT_DIRECTORY, "data", "roots.txt")
+        self.height = height
+        self.reference_file_path_and_name = reference_file_path_and_name
+
+
+    @staticmethod
+    def settings():
+        """Return all checked settings as keyword arguments of Root_System."""
+        return [{"engine": engine, "storage": storage, "enumeration": enumeration, "closed_forms": closed_forms}
+                for engine, storage, enumeration, closed_forms
+                in itertools.product(Root_System.ENGINES, Root_System.STORAGES, ("strings", "lattice"), ("on", "off"))]
+
+
+    def run(self, progress=True):
+        """
+        Construct the root system with every setting and compare it with the
+        reference. Returns a dictionary from the names of the failed settings
+        to a description of the failure, which is empty if all settings pass.
+
+        Keyword arguments:
+            progress: If True, print one line per setting
+        """
+
+        _algebra = Feingold_Frenkel_Algebra(closed_form_height=self.height)
+        _reference = self._rows(Root_Catalog.from_txt_file(_algebra, self.reference_file_path_and_name))
+        _reference = {vector: mult for vector, mult in _reference.items() if sum(vector) <= self.height}
+        if max(sum(vector) for vector in _reference) < self.height:
+            raise ValueError("The reference table " + self.reference_file_path_and_name
+                             + " does not reach height " + str(self.height))
+
+        _failures = {}
+        for setting in self.settings():
+            _name = "_".join(setting[key] for key in ("engine", "storage", "enumeration", "closed_forms"))
+            _start = time.perf_counter()
+            try:
+                _root_system = Root_System(_algebra, **setting)
+                _root_system.construct(self.height)
+                _failure = self._compare(self._rows(Root_Catalog.from_root_system(_root_system)), _reference)
+            except Exception as error:
+                _failure = type(error).__name__ + ": " + str(error)
+
+            if _failure is not None:
+                _failures[_name] = _failure
+            if progress:
+                print(_name + ": " + ("FAILED, " + _failure if _failure is not None else "ok") + " ("
+                      + str(round(time.perf_counter() - _start, 2)) + " s)")
+
+        return _failures
+
+
+    @staticmethod
+    def _rows(catalog):
+        """Return the multiplicities of a catalog by their root vectors as tuples."""
+        return dict(zip(map(tuple, catalog.vectors.tolist()), catalog.mults.tolist()))
+
+
+    @staticmethod
+    def _compare(rows, reference):
+        """Return a description of the differences of two tables, or None if they are equal."""
+
+        _missing = [vector for vector in reference if vector not in rows]
+        _extra = [vector for vector in rows if vector not in reference]
+        _wrong = [vector for vector in rows if vector in reference and rows[vector] != reference[vector]]
+        if not (_missing or _extra or _wrong):
+            return None
+
+        _first = (_missing + _extra + _wrong)[0]
+        return (str(len(_missing)) + " missing, " + str(len(_extra)) + " extra and " + str(len(_wrong))
+                + " wrong roots, e.g. " + str(list(_first)))
@@ -39,6 +39,7 @@ Bokeh Development Team (2018). Bokeh: Python library for interactive visualizati
 URL http://www.bokeh.pydata.org.
 """
 
+import os
 import numpy as np
 from bokeh.models import Arrow, NormalHead, Range1d
 from bokeh.models import ColumnDataSource, LabelSet, CustomJS, Select, Div
@@ -47,12 +48,10 @@ from bokeh.layouts import column, row
 from bokeh.plotting import figure
 from bokeh.embed import file_html
 from bokeh.resources import CDN
+from rootsystem.feingold_frenkel_algebra import Feingold_Frenkel_Algebra
+from rootsystem.root_catalog import Root_Catalog
 
 
-def norm(root):
-    """Compute the norm of a root from its root vector"""
-    return np.dot(root, np.dot(root, np.array([[2,-1,0],[-1,2,-2],[0,-2,2]])))
-
 def make_2d_plot(max_depth, max_level):
     """Create the 2D plot and return it as html document"""    
 
@@ -63,24 +62,31 @@ def make_2d_plot(max_depth, max_level):
     #                       #
     #########################
 
-    # Import the roots from the data/ folder
-    try:
-        roots = np.genfromtxt('data/roots.txt', delimiter=',',dtype=int)
-    except IOError:
-        print("Could not find roots.txt in data/.") 
-
-    # Each row in roots is a list with the four entires
-    # [level, depth, spin label, multiplicity]
-
-
-    # We sort the roots of level 1 to max_level into a new list:
-    roots_sorted = [[[] for _ in range(4)] for _ in range(max_level)]       
-    for elem in roots:
-        if elem[0] > 0 and elem[0] <= max_level and elem[1] <= max_depth:
-            roots_sorted[elem[0] - 1][0].append(np.int64(elem[1]).item())
-            roots_sorted[elem[0] - 1][1].append(np.int64(elem[2]).item())
-            roots_sorted[elem[0] - 1][2].append(np.int64(elem[3]).item())
-            roots_sorted[elem[0] - 1][3].append(np.int64(norm(elem[:3])).item())
+    # Import the roots from the data/ folder. Only the rows of the plotted
+    # levels and depths are read from the binary table if it exists. A binary
+    # table that is older than roots.txt is left over from an earlier run.
+    algebra = Feingold_Frenkel_Algebra()
+    has_bin = os.path.exists('data/roots.bin')
+    has_txt = os.path.exists('data/roots.txt')
+    if has_bin and (not has_txt or os.path.getmtime('data/roots.bin') >= os.path.getmtime('data/roots.txt')):
+        catalog = Root_Catalog.from_store(algebra, 'data/roots.bin', max_level, max_depth)
+    elif has_txt:
+        catalog = Root_Catalog.from_txt_file(algebra, 'data/roots.txt')
+    else:
+        raise IOError("Could not find roots.bin or roots.txt in data/.")
+
+    # Each root vector has the three entries [level, depth, spin label]
+
+
+    # We sort the depths, spin labels, multiplicities and norms
+    # of the roots of level 1 to max_level into a new list:
+    roots_sorted = []
+    for level in range(1, max_level + 1):
+        level_roots = catalog.by_level(level, max_depth)
+        roots_sorted.append([level_roots.vectors[:, 1].tolist(),
+                             level_roots.vectors[:, 2].tolist(),
+                             level_roots.mults.tolist(),
+                             level_roots.norms.tolist()])
 
 
     ###################
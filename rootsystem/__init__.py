@@ -1,5 +1,16 @@
+from .kac_moody_algebra import Kac_Moody_Algebra
 from .feingold_frenkel_algebra import Feingold_Frenkel_Algebra
 from .root_system import Root_System
 from .root import Root
+from .root_layer import Root_Layer
+from .root_region import Root_Region
+from .root_writer import Root_Writer
+from .root_store import Root_Store
+from .root_catalog import Root_Catalog
+from .mult_estimator import Mult_Estimator
+from .root_planner import Root_Planner
+from .root_profiler import Root_Profiler
+from .root_batch import Root_Batch
 
-__all__ = ["Feingold_Frenkel_Algebra", "Root_System", "Root"]
\ No newline at end of file
+__all__ = ["Kac_Moody_Algebra", "Feingold_Frenkel_Algebra", "Root_System", "Root", "Root_Layer", "Root_Region", "Root_Writer", "Root_Store", "Root_Catalog",
+           "Mult_Estimator", "Root_Planner", "Root_Profiler", "Root_Batch"]
\ No newline at end of file
@@ -27,10 +27,56 @@ the root system of the Feingold-Frenkel algebra.
 The package is called with one optional argument from the command line.
 The argument is the height up to which the root system will be constructed.
 If no argument is given the calculation defaults to a height of 76.
+The option --engine selects how the Peterson formula is evaluated
+(see Root_System.ENGINES). It defaults to the hash-joined "join" engine.
+The option --storage selects how finished heights are kept in memory
+(see Root_System.STORAGES). With "dominant" only the orbit representatives
+under the Weyl group are kept.
+The option --closed-forms selects if the multiplicities of the levels 0 to 2
+are taken from their closed forms ("on", the default), from the Peterson
+formula ("off"), or from both with a warning if they differ ("check").
+The option --enumeration selects how the roots of the next height are found
+(see Root_System.ENUMERATIONS). By default ("lattice") they are enumerated
+from the norms of the lattice vectors, with "check" the root strings are
+compared with this enumeration.
+The option --jobs sets the number of processes that evaluate the Peterson
+formula for the roots of one height in parallel. It is limited to the number
+of CPUs, and heights with only a few roots are evaluated in the main process.
+The option --resume continues the construction from a file written by a
+previous run, e.g. python -m rootsystem --resume data/roots.txt 90 only
+constructs the heights above the largest height stored in data/roots.txt.
+The options --max-level, --max-depth and --min-norm restrict the construction
+to a window of the root system (see Root_Region). Only the roots that the
+Peterson formula needs for the roots of the window are constructed. The
+window is recorded in the first line of data/roots.txt, so --resume continues
+the construction of the same window.
+The option --plan predicts the time and the memory of every height from a
+construction of the low heights (see Root_Planner), prints them together
+with the fastest settings and exits. The option --auto constructs the root
+system with these settings instead of --engine, --storage and --jobs. The
+options --time-budget and --memory-budget restrict the settings that are
+chosen.
+The option --max-memory keeps the finished heights of the roots and of the
+root multiples within a memory budget by moving the least recently used ones
+to disk (see Layer_Cache). It uses the compact storage mode. The height under
+construction and the indexes of the construction stay in memory.
+The options --stats, --progress, --trace-memory and --profile-heights record
+the metrics of every height (see Root_Profiler). --stats writes them to a
+JSON lines file, --progress prints a progress line with the estimated
+remaining time, --trace-memory adds the peak memory of every height and
+--profile-heights runs a range of heights under cProfile, whose statistics
+are written to data/profile.prof.
+The option --hash-stats prints the hash table statistics of every height
+after the construction.
+The option --batch constructs the root systems of all algebras in a JSON file
+instead, with --jobs algebras in parallel (see Root_Batch). Their root tables
+are written to the directory given by --batch-directory, by default data/batch.
 
 Upon executing the rootsystem package the root system is automatically 
 constructed up to the given height and stored as a csv file in the 
-data/ folder. The first three numbers in each row are the root vector and
+data/ folder. Every height is written as soon as it is finished.
+A binary copy of the table, which can be memory-mapped by Root_Store,
+is stored as data/roots.bin. The first three numbers in each row are the root vector and
 the last number is the multiplicity of that root.
 """
 
@@ -38,6 +84,11 @@ import argparse
 import time
 from .feingold_frenkel_algebra import Feingold_Frenkel_Algebra
 from .root_system import Root_System
+from .root_region import Root_Region
+from .root_writer import Root_Writer
+from .root_planner import Root_Planner
+from .root_profiler import Root_Profiler
+from .root_batch import Root_Batch
 
 def _check_positive(value):
         """Check if the argument given to the parser is a positive int."""
@@ -47,6 +98,25 @@ def _check_positive(value):
         return _value
 
 
+def _check_non_negative(value):
+        """Check if the argument given to the parser is a non-negative int."""
+        _value = int(value)
+        if _value < 0:
+                raise argparse.ArgumentTypeError("%s is an invalid non-negative int value" % value)
+        return _value
+
+
+def _print_hash_statistics(root_system):
+        """Print the hash statistics of the root system as a table."""
+        _columns = ["height", "roots", "buckets",
+                    "packed_bucket_collisions", "packed_mean_probes", "packed_max_probes",
+                    "legacy_collisions", "legacy_bucket_collisions", "legacy_mean_probes", "legacy_max_probes"]
+        
+        print(",".join(_columns))
+        for entry in root_system.hash_statistics():
+                print(",".join(str(round(entry[column], 2)) for column in _columns))
+
+
 def _parse_argument():
         """
         Parse an argument from the user or resort to default if 
@@ -57,6 +127,50 @@ def _parse_argument():
         _parser.add_argument("height", metavar="h", nargs="?", const=76, default=76, 
                              type=_check_positive,
                              help="The height up to which the root system will be constructed.")
+        _parser.add_argument("--engine", choices=Root_System.ENGINES, default="join",
+                             help="The method used to evaluate the Peterson formula.")
+        _parser.add_argument("--storage", choices=Root_System.STORAGES, default="objects",
+                             help="The way finished heights are stored.")
+        _parser.add_argument("--closed-forms", choices=Root_System.CLOSED_FORMS, default="on",
+                             help="The use of the closed forms for the levels 0 to 2.")
+        _parser.add_argument("--enumeration", choices=Root_System.ENUMERATIONS, default="lattice",
+                             help="The way the roots of the next height are found.")
+        _parser.add_argument("--jobs", metavar="N", default=1, type=_check_positive,
+                             help="The number of processes used for the Peterson formula, at most the number of CPUs.")
+        _parser.add_argument("--resume", metavar="FILE", default=None,
+                             help="Continue the construction from a previously exported root table.")
+        _parser.add_argument("--max-level", metavar="L", default=None, type=_check_non_negative,
+                             help="Only construct the roots needed for the levels up to L.")
+        _parser.add_argument("--max-depth", metavar="D", default=None, type=_check_non_negative,
+                             help="Only construct the roots needed for the depths up to D.")
+        _parser.add_argument("--min-norm", metavar="N", default=None, type=int,
+                             help="Only construct the roots needed for the norms of at least N.")
+        _parser.add_argument("--plan", action="store_true",
+                             help="Print the predicted time and memory of the construction and exit.")
+        _parser.add_argument("--auto", action="store_true",
+                             help="Choose the engine, the storage mode and the number of jobs automatically.")
+        _parser.add_argument("--time-budget", metavar="SECONDS", default=None, type=_check_positive,
+                             help="The largest time of the construction for --plan and --auto.")
+        _parser.add_argument("--memory-budget", metavar="MB", default=None, type=_check_positive,
+                             help="The largest memory of the construction for --plan and --auto.")
+        _parser.add_argument("--max-memory", metavar="MB", default=None, type=_check_positive,
+                             help="Move finished heights of the roots and root multiples beyond this memory to disk. "
+                                  "The height under construction and the indexes stay in memory.")
+        _parser.add_argument("--stats", metavar="FILE", default=None,
+                             help="Write the metrics of every height to a JSON lines file.")
+        _parser.add_argument("--progress", action="store_true",
+                             help="Print the progress and the estimated remaining time.")
+        _parser.add_argument("--trace-memory", action="store_true",
+                             help="Record the peak memory of every height.")
+        _parser.add_argument("--profile-heights", metavar=("FIRST", "LAST"), nargs=2, default=None,
+                             type=_check_positive,
+                             help="Run the heights from FIRST to LAST under cProfile.")
+        _parser.add_argument("--hash-stats", action="store_true",
+                             help="Print hash collision and bucket statistics of every height.")
+        _parser.add_argument("--batch", metavar="FILE", default=None,
+                             help="Construct the root systems of all algebras in a JSON file.")
+        _parser.add_argument("--batch-directory", metavar="DIR", default="data/batch",
+                             help="The directory of the root tables of --batch.")
         
         return _parser.parse_args()
 
@@ -75,16 +189,92 @@ def main():
         _start_time = time.time()
         
         # Define the algebra and the root system
-        _algebra = Feingold_Frenkel_Algebra()
-        _root_system = Root_System(_algebra)
-        _height = _parse_argument().height
+        _arguments = _parse_argument()
+        _height = _arguments.height
+        
+        # Construct a batch of algebras instead of the Feingold-Frenkel algebra
+        if _arguments.batch is not None:
+                _batch = Root_Batch.from_json_file(_arguments.batch, directory=_arguments.batch_directory,
+                                                   engine=_arguments.engine, storage=_arguments.storage,
+                                                   closed_forms=_arguments.closed_forms,
+                                                   enumeration=_arguments.enumeration, workers=_arguments.jobs)
+                print("Constructing the root systems of " + str(len(_batch.algebras))
+                      + " algebras up to height " + str(_height))
+                _batch.run(_height)
+                print("Construction completed in " + str(round(time.time() - _start_time)) + " seconds")
+                return
+        
+        _algebra = Feingold_Frenkel_Algebra(closed_form_height=_height)
+        
+        # Restrict the construction to a window if any of its bounds is given
+        _region = None
+        if any(bound is not None for bound in (_arguments.max_level, _arguments.max_depth, _arguments.min_norm)):
+                _region = Root_Region(_arguments.max_level, _arguments.max_depth, _arguments.min_norm)
+        
+        # Predict the construction and choose its settings
+        if _arguments.plan or _arguments.auto:
+                _planner = Root_Planner(_algebra, closed_forms=_arguments.closed_forms, region=_region)
+                _memory_budget = None if _arguments.memory_budget is None else _arguments.memory_budget * 2**20
+                _plan = _planner.plan(_height, _arguments.time_budget, _memory_budget)
+                
+                print("Planned settings: --engine " + _plan["engine"] + " --storage " + _plan["storage"]
+                      + " --jobs " + str(_plan["workers"]) + ", predicted time " + str(round(_plan["time"], 1))
+                      + " seconds, predicted memory " + str(round(_plan["memory"] / 2**20, 1)) + " MB")
+                if not _plan["fits"]:
+                        print("WARNING: No settings fit into the given budgets.")
+                
+                if _arguments.plan:
+                        _planner.print_prediction(_height, _plan)
+                        return
+                
+                _arguments.engine, _arguments.storage, _arguments.jobs = _plan["engine"], _plan["storage"], _plan["workers"]
+        
+        # Heights can only be moved to disk in the compact storage mode
+        _max_memory = None
+        if _arguments.max_memory is not None:
+                _max_memory = _arguments.max_memory * 2**20
+                if _arguments.storage != "compact":
+                        print("Using the compact storage mode to keep the memory below "
+                              + str(_arguments.max_memory) + " MB")
+                        _arguments.storage = "compact"
+        
+        if _arguments.resume is not None:
+                print("Loading the root system from " + _arguments.resume)
+                _root_system = Root_System.from_txt_file(_algebra, _arguments.resume,
+                                                         engine=_arguments.engine, storage=_arguments.storage,
+                                                         closed_forms=_arguments.closed_forms,
+                                                         enumeration=_arguments.enumeration,
+                                                         max_memory=_max_memory)
+        else:
+                _root_system = Root_System(_algebra, engine=_arguments.engine, storage=_arguments.storage,
+                                           closed_forms=_arguments.closed_forms, enumeration=_arguments.enumeration,
+                                           max_memory=_max_memory)
+        
+        # Record the metrics of every height if any of them is asked for
+        _profiler = None
+        if (_arguments.stats is not None or _arguments.progress or _arguments.trace_memory
+                or _arguments.profile_heights is not None):
+                _profiler = Root_Profiler(_arguments.stats, progress=_arguments.progress,
+                                          trace_memory=_arguments.trace_memory,
+                                          profile_heights=_arguments.profile_heights)
         
         # Print a status message
         print("Constructing the root system up to height " + str(_height))
         
-        # Construct the root system and save it to a file
-        _root_system.construct(_height)      
-        _root_system.write_txt_file("data/roots.txt")
+        # Construct the root system and write every height to a file
+        # in the background as soon as it is finished
+        try:
+                with Root_Writer("data/roots.txt", background=True) as _writer:
+                        _root_system.construct(_height, workers=_arguments.jobs, region=_region, writer=_writer,
+                                               profiler=_profiler)
+        except IOError:
+                print("The file could not be written!")
+        
+        # Store a binary copy of the table for fast reading
+        _root_system.write_store("data/roots.bin")
+        
+        if _arguments.hash_stats:
+                _print_hash_statistics(_root_system)
         
         # Write completion message
         _end_time = round(time.time() - _start_time)
@@ -24,6 +24,7 @@
 # Changes from the original:
 # - Specialized to the Feingold-Frenkel algebra F
 # - The class does not require a Cartan matrix as an input
+# - The general properties are inherited from Kac_Moody_Algebra
 # - Removed a number of symbols and functions that are not relevant to
 #   constructing the root system of F 
 
@@ -39,58 +40,168 @@ algebra F.
 """
 
 import numpy as np
+from .kac_moody_algebra import Kac_Moody_Algebra
 
-class Feingold_Frenkel_Algebra:
+
+def _partition_numbers(bound):
+    """Return the list of partition numbers p(0), ..., p(bound)."""
+    
+    _partitions = [1] + [0] * bound
+    for k in range(1, bound + 1):
+        for n in range(k, bound + 1):
+            _partitions[n] += _partitions[n - k]
+            
+    return _partitions
+
+
+class Feingold_Frenkel_Algebra(Kac_Moody_Algebra):
     """
     Feingold_Frenkel_Algebra stores information on the Feingold-Frenkel algebra F.
     
-    Attributes:
-        cartan_matrix: The Cartan matrix of F
-        rank: The rank of F
-    """
+    The first component of a root vector is the level of the root, the other
+    two components belong to the affine subalgebra A_1^(1). The multiplicities
+    of the roots of level 0, 1 and 2 are known in closed form, see closed_form_mult.
     
+    The general properties of the algebra are those of Kac_Moody_Algebra.
     
-    def __init__(self):
-        """Initializes Feingold_Frenkel_Algebra."""   
-        self.cartan_matrix = np.array([[2,-1,0],[-1,2,-2],[0,-2,2]])
-        self.d = np.diag([1,1,1])
-        self.rank = 3
-        self.finite = False
-        self.metric = np.dot(self.cartan_matrix, self.d)
-     
-        
-    def inner_product(self, root_1, root_2):
-        """Computes the inner product of root_1 and root_2."""
-        
-        return np.dot(root_1.vector , np.dot(self.metric, root_2.vector))
+    Attributes:
+        closed_form_height: The height up to which the closed forms are tabulated
+    """
     
     
-    def root_to_weight(self, root_vector):
-        """Computes the weight vector of a root."""
-        return np.dot(root_vector, self.cartan_matrix)
+    def __init__(self, closed_form_height=128):
+        """
+        Initializes Feingold_Frenkel_Algebra.
+        
+        Keyword arguments:
+            closed_form_height: The height up to which the closed forms of the
+                                multiplicities at level 0 to 2 are tabulated
+        """
+        
+        super().__init__([[2,-1,0],[-1,2,-2],[0,-2,2]], d=[1,1,1], name="feingold_frenkel")
+        self.closed_form_height = closed_form_height
+        
+        # The tables of the closed forms are only created when they are first used
+        self._level_one_table = None
+        self._level_two_table = None
+        
+        
+    def is_real_root(self, root_vector):
+        """
+        Check if a positive vector, given as a list, is a real root.
         
+        The real roots of F are exactly the positive vectors of norm 2 with a
+        connected support (Feingold and Frenkel). The support of a vector of
+        norm 2 is only disconnected if it has the form (l, 0, w) with l, w > 0.
+        """
+        
+        _level, _depth, _weight = root_vector
+        _norm = 2 * (_level * _level + _depth * _depth + _weight * _weight - _level * _depth - 2 * _depth * _weight)
         
-    def simp_weyl_refl_root(self, root_vector, i):
+        return _norm == 2 and min(root_vector) >= 0 and not (_depth == 0 and _level > 0 and _weight > 0)
+    
+    
+    def closed_form_mult(self, root_vector):
         """
-        Computes a simple Weyl reflection of a root
+        Return the multiplicity of a positive vector of level 0, 1 or 2 from the
+        closed forms, or None if the vector is not covered by the tables.
+        
+        At level 0 the roots are the roots of A_1^(1), which all have multiplicity 1.
+        At level 1 the multiplicity of a vector with norm at most 2 is the partition
+        number p(1 - norm/2) (Feingold and Frenkel). At level 2 the roots span the
+        second exterior power of the level 1 roots divided by the A_1^(1) module
+        generated by the Serre relation of the roots (1,0,0) and (0,1,0) (Kang).
         
         Keyword arguments:
-            root_vector: The root vector to reflect
-            i: The index of the simple root with respect to which we reflect.
+            root_vector: The vector whose multiplicity is returned
         """
         
-        # Do not reflect for imaginary simple roots.
-        if self.cartan_matrix[i][i] <= 0:
-            return root_vector
+        _vector = [int(x) for x in root_vector]
+        _level = _vector[0]
+        _height = sum(_vector)
         
-        _output = root_vector.copy()
-        _dynkin_labels = self.root_to_weight(root_vector)
-
-        _output[i] = _output[i] - _dynkin_labels[i]
+        if _level > 2 or min(_vector) < 0 or _height == 0 or _height > self.closed_form_height:
+            return None
+            
+        if self._level_one_table is None:
+            self._tabulate_closed_forms()
+            
+        _depth, _weight = _vector[1], _vector[2]
+        
+        if _level == 0:
+            return 1 if abs(_depth - _weight) <= 1 else 0
+        
+        if _level == 1:
+            return int(self._level_one_table[_depth, _weight])
+        
+        # The character of the second exterior power is (chi(q)^2 - chi(q^2)) / 2
+        _table = self._level_one_table
+        _mult = np.sum(_table[:_depth+1, :_weight+1] * _table[_depth::-1, _weight::-1])
+        if _depth % 2 == 0 and _weight % 2 == 0:
+            _mult -= _table[_depth//2, _weight//2]
+        _mult //= 2
         
-        return _output
+        # Remove the module generated by the Serre relation,
+        # whose highest weight is the vector (2,1,0)
+        if _depth >= 1:
+            _mult -= self._level_two_table[_depth-1, _weight]
+            
+        return int(_mult)
     
     
-    def rho(self, root):
-        """Calculate the action of the Weyl vector on a root."""
-        return np.sum(np.dot(root.vector, self.d))
\ No newline at end of file
+    def _tabulate_closed_forms(self):
+        """
+        Tabulate the level 1 multiplicities and the weight multiplicities of
+        the A_1^(1) module that is removed at level 2, indexed by the last two
+        components of the root vectors.
+        """
+        
+        _size = self.closed_form_height
+        
+        # The level 1 multiplicities are partition numbers. The norm of a level 1
+        # vector is 2 + 2 (r0 - r1)^2 - 2 r0, so we need p(n) up to n = size.
+        _partitions = _partition_numbers(_size)
+        _depths = np.indices((_size, _size)).reshape(2, -1).T
+        _vectors = np.column_stack((np.ones(len(_depths), dtype=np.int64), _depths))
+        _norms = np.einsum("ij,jk,ik->i", _vectors, self.metric, _vectors)
+        
+        _level_one = [_partitions[1 - norm // 2] if norm <= 2 else 0 for norm in _norms.tolist()]
+        self._level_one_table = np.array(_level_one, dtype=object).reshape(_size, _size)
+        
+        # The Dynkin labels of the highest weight of the module that is removed,
+        # shifted by the Weyl vector of A_1^(1)
+        _affine_cartan = self.cartan_matrix[1:, 1:].tolist()
+        _labels = (1 - np.dot([2, 1, 0], self.cartan_matrix)[1:]).tolist()
+        
+        # The numerator of the Weyl-Kac character formula. Every Weyl group element w
+        # contributes sign(w) at the depth mu_w of w(lambda + rho) below lambda + rho.
+        _table = np.zeros((_size, _size), dtype=object)
+        _table[0, 0] = 1
+        _frontier = [((0, 0), 1)]
+        while _frontier:
+            _next_frontier = []
+            for mu, sign in _frontier:
+                for i in range(2):
+                    _step = _labels[i] - sum(_affine_cartan[i][j] * mu[j] for j in range(2))
+                    _nu = list(mu)
+                    _nu[i] += _step
+                    if _step > 0 and max(_nu) < _size:
+                        _table[_nu[0], _nu[1]] -= sign
+                        _next_frontier.append((tuple(_nu), -sign))
+            _frontier = _next_frontier
+            
+        # Divide by the Weyl-Kac denominator, i.e. the product of 1 / (1 - e^-alpha)
+        # over the positive roots alpha of A_1^(1), which all have multiplicity 1
+        _affine_roots = [(0, 1)]
+        for n in range(1, _size):
+            _affine_roots += [(n, n), (n, n + 1), (n, n - 1)]
+        
+        for root in _affine_roots:
+            if root[0] == 0:
+                for y in range(root[1], _size):
+                    _table[:, y] += _table[:, y - root[1]]
+            else:
+                for x in range(root[0], _size):
+                    _table[x, root[1]:] += _table[x - root[0], :_size - root[1]]
+                    
+        self._level_two_table = _table
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# This class is based on the Algebra class from the SimpLie programm written
+# by Teake Nutma, which is available at https://github.com/teake/simplie.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class creates an object which has the properties of the Kac-Moody
+algebra of a symmetrizable Cartan matrix, that are needed to construct
+its root system.
+"""
+
+import math
+import numpy as np
+from fractions import Fraction
+from .root import MAX_RANK
+
+
+class Kac_Moody_Algebra:
+    """
+    Kac_Moody_Algebra stores information on the Kac-Moody algebra of a
+    symmetrizable generalized Cartan matrix.
+
+    The entries of the Cartan matrix are a_ij = 2 (alpha_i|alpha_j) / (alpha_j|alpha_j),
+    so the inner products of the simple roots are the metric A d, where d is
+    the diagonal matrix of the halves (alpha_j|alpha_j) / 2.
+
+    The type of the algebra is "finite", "affine", "hyperbolic" or
+    "indefinite". For the first three types the imaginary roots are exactly
+    the positive vectors with a connected support and a norm of at most 0
+    (Kac, Proposition 5.10), which the lattice enumeration of Root_System uses.
+
+    The root vectors are packed into int64 keys, so the rank is at most
+    MAX_RANK, i.e. 3.
+
+    Attributes:
+        cartan_matrix: The Cartan matrix of the algebra
+        d: The diagonal matrix that symmetrizes the Cartan matrix
+        metric: The inner products of the simple roots
+        rank: The rank of the algebra
+        finite: True if the algebra is finite dimensional
+        type: The type of the algebra
+        name: The name of the algebra, e.g. for the files of its root table
+    """
+
+
+    def __init__(self, cartan_matrix, d=None, name=None):
+        """
+        Initializes Kac_Moody_Algebra.
+
+        Keyword arguments:
+            cartan_matrix: A symmetrizable generalized Cartan matrix
+            d: The diagonal of the matrix d, or the matrix itself. By default
+               the smallest positive integers that symmetrize the Cartan matrix.
+            name: The name of the algebra, by default built from the Cartan matrix
+        """
+
+        self.cartan_matrix = np.array(cartan_matrix, dtype=np.int64)
+        self.rank = len(self.cartan_matrix)
+        self._check_cartan_matrix()
+
+        if d is None:
+            d = self._symmetrizer()
+        self.d = np.array(d, dtype=np.int64)
+        if self.d.ndim == 1:
+            self.d = np.diag(self.d)
+        self.metric = np.dot(self.cartan_matrix, self.d)
+        if np.any(np.diag(self.d) <= 0) or not np.array_equal(self.metric, self.metric.T):
+            raise ValueError("The matrix d does not symmetrize the Cartan matrix.")
+
+        self.type = self._classify()
+        self.finite = self.type == "finite"
+        self.name = name if name is not None else "km_" + "_".join(str(x) for x in self.cartan_matrix.flatten().tolist())
+
+        # The norms of the real roots are the norms of the simple roots
+        self._real_norms = sorted(set(np.diag(self.metric).tolist()))
+        self._cartan_rows = self.cartan_matrix.tolist()
+        self._metric_rows = self.metric.tolist()
+
+        # The terms of the denominator identity, see weyl_denominator
+        self._denominator_height = 0
+        self._denominator_terms = (np.zeros((0, self.rank), dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+
+    def _check_cartan_matrix(self):
+        """Raise a ValueError if the Cartan matrix is not a generalized Cartan matrix."""
+
+        _matrix = self.cartan_matrix
+        if _matrix.ndim != 2 or _matrix.shape[0] != _matrix.shape[1]:
+            raise ValueError("The Cartan matrix has to be square.")
+        if self.rank > MAX_RANK:
+            raise ValueError("The rank of the algebra can be at most " + str(MAX_RANK) + ", not " + str(self.rank))
+        if np.any(np.diag(_matrix) != 2):
+            raise ValueError("The diagonal of the Cartan matrix has to be 2.")
+
+        _off_diagonal = ~np.eye(self.rank, dtype=bool)
+        if np.any(_matrix[_off_diagonal] > 0):
+            raise ValueError("The off-diagonal entries of the Cartan matrix can not be positive.")
+        if np.any((_matrix == 0) != (_matrix.T == 0)):
+            raise ValueError("The Cartan matrix needs a_ij = 0 exactly if a_ji = 0.")
+
+
+    def _symmetrizer(self):
+        """
+        Return the smallest positive integers d_j such that a_ij d_j is
+        symmetric, or raise a ValueError if the Cartan matrix is not
+        symmetrizable. Every connected component of the Dynkin diagram
+        starts with d_j = 1.
+        """
+
+        _d = [None] * self.rank
+        _rows = self.cartan_matrix.tolist()
+        for start in range(self.rank):
+            if _d[start] is not None:
+                continue
+            _d[start] = Fraction(1)
+            _boundary = [start]
+            while _boundary:
+                i = _boundary.pop()
+                for j in range(self.rank):
+                    if j == i or _rows[i][j] == 0:
+                        continue
+                    # a_ij d_j = a_ji d_i
+                    _value = _d[i] * _rows[j][i] / _rows[i][j]
+                    if _d[j] is None:
+                        _d[j] = _value
+                        _boundary.append(j)
+                    elif _d[j] != _value:
+                        raise ValueError("The Cartan matrix is not symmetrizable.")
+
+        _denominator = math.lcm(*(value.denominator for value in _d))
+        _d = [int(value * _denominator) for value in _d]
+        _gcd = math.gcd(*_d)
+
+        return [value // _gcd for value in _d]
+
+
+    def _classify(self):
+        """
+        Return the type of the algebra from the signature of the metric.
+        The metric is positive definite for the finite algebras and positive
+        semi-definite for the affine algebras. A hyperbolic algebra is neither,
+        but removing any simple root leaves finite or affine algebras.
+        """
+
+        def _eigenvalues(matrix):
+            _values = np.linalg.eigvalsh(matrix.astype(float))
+            _tolerance = 1e-9 * max(1.0, float(np.max(np.abs(matrix))))
+            return np.where(np.abs(_values) < _tolerance, 0.0, _values)
+
+        _values = _eigenvalues(self.metric)
+        if np.all(_values > 0):
+            return "finite"
+        if np.all(_values >= 0):
+            return "affine"
+
+        for i in range(self.rank):
+            _rest = [j for j in range(self.rank) if j != i]
+            if np.any(_eigenvalues(self.metric[np.ix_(_rest, _rest)]) < 0):
+                return "indefinite"
+
+        return "hyperbolic"
+
+
+    def inner_product(self, root_1, root_2):
+        """
+        Computes the inner product of root_1 and root_2.
+
+        The result is a Python int, such that it never overflows
+        when used in the multiplicity calculations.
+        """
+
+        return int(np.dot(root_1.vector , np.dot(self.metric, root_2.vector)))
+
+
+    def root_to_weight(self, root_vector):
+        """Computes the weight vector of a root."""
+        return np.dot(root_vector, self.cartan_matrix)
+
+
+    def is_real_root(self, root_vector):
+        """
+        Check if a positive vector, given as a list, is a real root.
+
+        A real root has the norm of a simple root and its Weyl orbit contains
+        that simple root. Every simple Weyl reflection in an index with a
+        positive Dynkin label lowers the height, so the vector is reflected
+        down until it is a simple root, leaves the positive vectors or has
+        no positive Dynkin label.
+        """
+
+        _vector = [int(x) for x in root_vector]
+        if min(_vector) < 0:
+            return False
+
+        _norm = sum(self._metric_rows[i][j] * _vector[i] * _vector[j]
+                    for i in range(self.rank) for j in range(self.rank))
+        if _norm not in self._real_norms:
+            return False
+
+        _height = sum(_vector)
+        while _height > 1:
+            for i in range(self.rank):
+                _label = sum(_vector[j] * self._cartan_rows[j][i] for j in range(self.rank))
+                if _label > 0:
+                    _vector[i] -= _label
+                    _height -= _label
+                    if _vector[i] < 0:
+                        return False
+                    break
+            else:
+                return False
+
+        return _height == 1
+
+
+    def is_real_norm(self, norms):
+        """Check which norms of an array are norms of real roots."""
+        return np.isin(norms, self._real_norms)
+
+
+    def max_real_norm(self):
+        """Return the largest norm of a real root."""
+        return self._real_norms[-1]
+
+
+    def simp_weyl_refl_root(self, root_vector, i):
+        """
+        Computes a simple Weyl reflection of a root
+
+        Keyword arguments:
+            root_vector: The root vector to reflect
+            i: The index of the simple root with respect to which we reflect.
+        """
+
+        # Do not reflect for imaginary simple roots.
+        if self.cartan_matrix[i][i] <= 0:
+            return root_vector
+
+        _output = root_vector.copy()
+        _dynkin_labels = self.root_to_weight(root_vector)
+
+        _output[i] = _output[i] - _dynkin_labels[i]
+
+        return _output
+
+
+    def weyl_denominator(self, max_height):
+        """
+        Return the terms of the Weyl-Kac denominator identity up to a height.
+
+        The identity reads prod_alpha (1 - e^-alpha)^mult(alpha) = sum_w sign(w) e^(w rho - rho),
+        where the product runs over the positive roots and the sum over the Weyl group.
+        Returns the vectors rho - w rho of the non-trivial Weyl group elements up
+        to the given height, sorted by their height, and the signs of the elements.
+
+        The elements are enumerated by their length. Since rho - s_i w rho is
+        s_i (rho - w rho) + alpha_i, every element is reached from a shorter one
+        by a simple Weyl reflection, whose height is smaller.
+
+        Keyword arguments:
+            max_height: The largest height of the vectors rho - w rho
+        """
+
+        if self._denominator_height < max_height:
+            _terms = {}
+            _frontier = {(0,) * self.rank: 1}
+            while _frontier:
+                _next_frontier = {}
+                for delta, sign in _frontier.items():
+                    _height = sum(delta)
+                    for i in range(self.rank):
+                        if self.cartan_matrix[i][i] <= 0:
+                            continue
+                        _next = self.simp_weyl_refl_root(np.array(delta), i)
+                        _next[i] += 1
+                        # Only go up, i.e. to the longer element
+                        if _height < int(np.sum(_next)) <= max_height:
+                            _next_frontier[tuple(_next.tolist())] = -sign
+                _terms.update(_next_frontier)
+                _frontier = _next_frontier
+
+            _vectors = np.array(list(_terms), dtype=np.int64).reshape(len(_terms), self.rank)
+            _order = np.argsort(np.sum(_vectors, axis=1), kind="stable")
+            self._denominator_terms = (_vectors[_order], np.array(list(_terms.values()), dtype=np.int64)[_order])
+            self._denominator_height = max_height
+
+        _vectors, _signs = self._denominator_terms
+        _keep = np.sum(_vectors, axis=1) <= max_height
+
+        return _vectors[_keep], _signs[_keep]
+
+
+    def rho(self, root):
+        """Calculate the action of the Weyl vector on a root."""
+        return int(np.sum(np.dot(root.vector, self.d)))
+
+
+    def closed_form_mult(self, root_vector):
+        """
+        Return the multiplicity of a positive vector from a closed form, or
+        None if there is none. A general algebra has no closed forms.
+        """
+        return None
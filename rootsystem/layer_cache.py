@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class keeps the heights of a root system and of its root multiples
+within a memory budget by moving finished heights to disk.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import weakref
+import numpy as np
+from collections import OrderedDict
+from .root_layer import Root_Layer
+
+
+def _layer_bytes(layer):
+    """
+    Return the memory that a layer holds. Memory-mapped arrays are
+    backed by the file, so they do not count.
+    """
+
+    _bytes = 0
+    for name in Root_Layer._ARRAYS:
+        _array = getattr(layer, name)
+        if isinstance(_array, np.memmap):
+            continue
+        _bytes += _array.nbytes
+        if _array.dtype == object:
+            _bytes += sum(sys.getsizeof(value) for value in _array.tolist())
+
+    return _bytes
+
+
+class _Budget:
+    """The memory of the finished heights in memory of the caches that share a budget."""
+
+    def __init__(self):
+        # The memory of every height in memory by the name of its cache
+        # and its index, least recently used first
+        self.resident = OrderedDict()
+        self.bytes = 0
+        # The caches by their names, as weak references
+        self.caches = {}
+
+
+class Layer_Cache:
+    """
+    A list of the heights of a root system that keeps the finished heights
+    in memory only while they fit into a budget.
+
+    Finished heights are Root_Layers. When they exceed the budget, the least
+    recently used ones are written to a directory with Root_Layer.save and
+    dropped from memory. Reading such a height loads it again, where its
+    int64 arrays are memory-mapped, so only its co-multiplicities and huge
+    multiplicities are read into memory. All other heights, namely the
+    dictionaries of the heights under construction, always stay in memory.
+
+    Several caches can share one budget and one directory, e.g. the roots
+    and the root multiples of a root system. The least recently used height
+    of all of them is then moved to disk first.
+
+    Attributes:
+        max_bytes: The memory budget of the finished heights in bytes
+        directory: The directory of the heights on disk
+        name: The prefix of the files of the heights on disk
+        spills: The number of heights that were written to disk
+        loads: The number of heights that were read from disk
+    """
+
+
+    def __init__(self, max_bytes, directory=None, layers=(), name="height", share_with=None):
+        """
+        Initialize a new cache.
+
+        Keyword arguments:
+            max_bytes: The memory budget of the finished heights in bytes
+            directory: The directory of the heights on disk. By default a
+                       temporary directory, which is removed with the cache.
+            layers: The heights to start with
+            name: The prefix of the files of the heights on disk
+            share_with: An optional cache whose budget and directory are
+                        shared, in which case max_bytes and directory are
+                        ignored. The names of the caches have to differ.
+        """
+
+        self.name = name
+        if share_with is not None:
+            if name in share_with._budget.caches:
+                raise ValueError("A cache with the name " + str(name) + " already shares this budget.")
+            self.max_bytes = share_with.max_bytes
+            self.directory = share_with.directory
+            self._budget = share_with._budget
+        else:
+            self.max_bytes = max_bytes
+            if directory is None:
+                self.directory = tempfile.mkdtemp(prefix="rootsystem-")
+                weakref.finalize(self, shutil.rmtree, self.directory, ignore_errors=True)
+            else:
+                self.directory = directory
+                os.makedirs(directory, exist_ok=True)
+            self._budget = _Budget()
+        self._budget.caches[name] = weakref.ref(self)
+
+        self.spills = 0
+        self.loads = 0
+
+        # The heights, where None marks a height on disk
+        self._layers = []
+        # The heights in memory whose copy on disk is missing or outdated
+        self._stale = set()
+        # The factors by which the co-multiplicities of the heights on disk
+        # have to be rescaled when they are read
+        self._factors = {}
+
+        for layer in layers:
+            self.append(layer)
+
+
+    def __len__(self):
+        """Return the number of heights."""
+        return len(self._layers)
+
+
+    def __iter__(self):
+        """Iterate over the heights, reading them from disk if necessary."""
+        for index in range(len(self._layers)):
+            yield self[index]
+
+
+    def __getitem__(self, index):
+        """Return a height, reading it from disk if necessary."""
+
+        index = range(len(self._layers))[index]
+        _layer = self._layers[index]
+        if _layer is None:
+            return self._load(index)
+
+        if (self.name, index) in self._budget.resident:
+            self._budget.resident.move_to_end((self.name, index))
+        return _layer
+
+
+    def __setitem__(self, index, layer):
+        """Replace a height."""
+
+        index = range(len(self._layers))[index]
+        self._forget(index)
+        self._layers[index] = layer
+        self._stale.add(index)
+        self._track(index)
+
+
+    def append(self, layer):
+        """Add a height on top."""
+        self._layers.append(None)
+        self[len(self._layers) - 1] = layer
+
+
+    def rescale(self, factor):
+        """Multiply the co-multiplicities of all finished heights by a factor."""
+
+        for index, layer in enumerate(self._layers):
+            if layer is None:
+                self._factors[index] = self._factors.get(index, 1) * factor
+            elif isinstance(layer, Root_Layer):
+                layer.co_mults *= factor
+                self._stale.add(index)
+            else:
+                for root in layer.values():
+                    if root.co_mult is not None:
+                        root.co_mult *= factor
+
+
+    def _path(self, index):
+        """Return the directory of a height on disk."""
+        return os.path.join(self.directory, self.name + "_" + str(index))
+
+
+    def _forget(self, index):
+        """Stop tracking the memory of a height."""
+        self._budget.bytes -= self._budget.resident.pop((self.name, index), 0)
+        self._factors.pop(index, None)
+
+
+    def _track(self, index):
+        """Track the memory of a finished height and keep the heights within the budget."""
+
+        _layer = self._layers[index]
+        if not isinstance(_layer, Root_Layer):
+            return
+
+        _budget = self._budget
+        _bytes = _layer_bytes(_layer)
+        _budget.resident[(self.name, index)] = _bytes
+        _budget.bytes += _bytes
+
+        # Move the least recently used heights of all caches of the budget
+        # to disk, but never the height that was just used
+        while _budget.bytes > self.max_bytes and len(_budget.resident) > 1:
+            _name, _index = next(iter(_budget.resident))
+            if (_name, _index) == (self.name, index):
+                _budget.resident.move_to_end((_name, _index))
+                continue
+            _budget.caches[_name]()._spill(_index)
+
+
+    def _spill(self, index):
+        """Write a height to disk, if its copy there is outdated, and drop it from memory."""
+
+        if index in self._stale:
+            self._layers[index].save(self._path(index))
+            self._stale.discard(index)
+            self.spills += 1
+
+        self._budget.bytes -= self._budget.resident.pop((self.name, index))
+        self._layers[index] = None
+
+
+    def _load(self, index):
+        """Read a height from disk."""
+
+        _layer = Root_Layer.load(self._path(index))
+        self.loads += 1
+
+        _factor = self._factors.pop(index, 1)
+        if _factor != 1:
+            _layer.co_mults *= _factor
+            self._stale.add(index)
+
+        self._layers[index] = _layer
+        self._track(index)
+
+        return _layer
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class evaluates the Peterson formula modulo several primes with
+array operations and rebuilds the exact multiplicities by Chinese
+remaindering.
+"""
+
+import math
+import numpy as np
+from functools import lru_cache
+
+# The primes are below 2^31, such that the product of two residues
+# fits into an int64
+_PRIME_BOUND = 2**31
+
+
+@lru_cache(maxsize=None)
+def _prime_below(n):
+    """Return the largest prime below n."""
+    _candidate = n - 1
+    while _candidate > 2 and any(_candidate % d == 0 for d in range(2, math.isqrt(_candidate) + 1)):
+        _candidate -= 1
+    return _candidate
+
+
+class Modular_Peterson:
+    """
+    An evaluation of the Peterson formula modulo several primes.
+
+    For every prime p the co-multiplicities of all vectors below the current
+    height are kept modulo p in a dense array, which is indexed by the
+    components of the vectors. The co-multiplicity of a vector v is the sum
+    of mult(v / k) / k over the divisors k of v, where the division by k is
+    the multiplication with the inverse of k modulo p. The Peterson sum of a
+    root is then one array operation over the box of vectors below it.
+
+    The exact multiplicities are rebuilt by Chinese remaindering. If the
+    result changes when the last prime is added, another prime is added
+    until the result is stable.
+
+    Attributes:
+        primes: The primes of the residues
+    """
+
+
+    def __init__(self, root_system, primes=2):
+        """
+        Initialize the residues of a root system.
+
+        Keyword arguments:
+            root_system: The root system whose multiplicities are calculated
+            primes: The number of primes to start with
+        """
+
+        self._root_system = root_system
+        self.primes = []
+        for _ in range(primes):
+            self.primes.append(_prime_below(self.primes[-1] if self.primes else _PRIME_BOUND))
+
+        self._size = 0
+        self._height = 0
+        self._co_mults = None
+
+
+    def calculate_mults(self, height, roots):
+        """
+        Calculate the multiplicities of roots of a height from the finished
+        heights below it. Returns the multiplicities in the order of the roots.
+        """
+
+        _vectors = [root.vector.tolist() for root in roots]
+        self._sync(height)
+
+        _residues = [self._residues(vector) for vector in _vectors]
+        _mults = [None] * len(roots)
+
+        while True:
+            for i, residues in enumerate(_residues):
+                if _mults[i] is None:
+                    _mults[i] = self._stable_mult(residues)
+            _unstable = [i for i in range(len(roots)) if _mults[i] is None]
+            if not _unstable:
+                return _mults
+
+            # Add a prime and compute the residues of the unstable roots again
+            self.primes.append(_prime_below(self.primes[-1]))
+            self._size = 0
+            self._sync(height)
+            for i in _unstable:
+                _residues[i] = self._residues(_vectors[i])
+
+
+    def _stable_mult(self, residues):
+        """
+        Rebuild a multiplicity from its residues. Returns None if it
+        changes when the residue of the last prime is added.
+        """
+
+        _mult, _modulus = 0, 1
+        for prime, residue in zip(self.primes, residues):
+            _previous = _mult
+            # Lift the result modulo the product of the primes so far
+            _step = (residue - _mult) * pow(_modulus, -1, prime) % prime
+            _mult += _modulus * _step
+            _modulus *= prime
+
+        return _mult if _mult == _previous else None
+
+
+    def _sync(self, height):
+        """Add the finished heights below a height to the residues."""
+
+        if self._size <= height:
+            # The box of a root of this height has to fit into the arrays.
+            # Leave some room for the next heights, since growing the arrays
+            # means adding all heights again.
+            self._size = (height // 32 + 1) * 32
+            self._height = 0
+            self._co_mults = np.zeros((len(self.primes),) + (self._size,) * self._root_system.rank, dtype=np.int64)
+            
+        for h in range(self._height + 1, height):
+            self._add_height(h)
+        self._height = max(self._height, height - 1)
+
+
+    def _add_height(self, height):
+        """Add the multiplicities of a finished height to the co-multiplicities of their multiples."""
+
+        _vectors, _mults = self._root_system._height_rows(height)
+        if len(_mults) == 0:
+            return
+
+        _primes = np.array(self.primes, dtype=np.int64)
+        _residues = np.array([[mult % prime for mult in _mults] for prime in self.primes], dtype=np.int64)
+
+        k = 1
+        while True:
+            _multiples = k * _vectors
+            _keep = np.all(_multiples < self._size, axis=1)
+            if not np.any(_keep):
+                return
+
+            _inverses = np.array([pow(k, -1, prime) for prime in self.primes], dtype=np.int64)
+            _cells = (slice(None),) + tuple(_multiples[_keep].T)
+            _added = _residues[:, _keep] * _inverses[:, None] % _primes[:, None]
+            self._co_mults[_cells] = (self._co_mults[_cells] + _added) % _primes[:, None]
+            k += 1
+
+
+    def _residues(self, vector):
+        """Return the residues of the multiplicity of a root vector, one per prime."""
+
+        _primes = np.array(self.primes, dtype=np.int64)
+        _moduli = _primes.reshape((-1,) + (1,) * len(vector))
+
+        # The co-multiplicities of beta and gamma = root - beta for all beta below the root
+        _box = tuple(slice(x + 1) for x in vector)
+        _betas = self._co_mults[(slice(None),) + _box]
+        _gammas = _betas[(slice(None),) + (slice(None, None, -1),) * len(vector)]
+
+        # The inner products (beta|gamma) = (beta|root) - (beta|beta)
+        _metric = self._root_system.algebra.metric.tolist()
+        _grid = np.ogrid[_box]
+        _inner_products = sum(_grid[i] * (np.dot(_metric[i], vector) - sum(_metric[i][j] * _grid[j]
+                                                                           for j in range(len(vector))))
+                              for i in range(len(vector))) % _moduli
+
+        _sums = np.sum(_betas * _gammas % _moduli * _inner_products % _moduli,
+                       axis=tuple(range(1, len(vector) + 1))) % _primes
+        if self._root_system._profiler is not None:
+            self._root_system._count("pairs_scanned", _betas[0].size)
+            self._root_system._count("pairs_matched", int(np.count_nonzero((_betas[0] != 0) & (_gammas[0] != 0))))
+            self._root_system._count("products", _betas.size)
+
+        # The Peterson formula gives the co-multiplicity of the root. The
+        # residues of its other parts are already in the arrays.
+        _algebra = self._root_system.algebra
+        _denominator = int(np.dot(vector, np.dot(_algebra.metric, vector))) - 2 * int(np.sum(np.dot(vector, _algebra.d)))
+        _residues = []
+        for prime, total, rest in zip(self.primes, _sums.tolist(), self._co_mults[(slice(None),) + tuple(vector)].tolist()):
+            _residues.append((total * pow(_denominator, -1, prime) - rest) % prime)
+
+        return _residues
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class estimates root multiplicities beyond the constructed heights
+from their growth in the norm.
+"""
+
+import bisect
+import math
+import numpy as np
+
+
+class Mult_Estimator:
+    """
+    Approximate multiplicities of arbitrary roots, calibrated against an
+    exact root table.
+
+    The multiplicity of an imaginary root mostly depends on its level and
+    its norm. With n = 1 - norm/2 the level 1 multiplicities are the
+    partition numbers p(n), which grow like exp(pi sqrt(2n/3)) / n (Hardy
+    and Ramanujan), and the multiplicities of the higher levels are bounded
+    by similar partition functions (Frenkel). So for every level the
+    logarithms of the exact multiplicities are fitted by
+        log(mult) = a + b sqrt(n) + c log(n).
+    The coefficients hardly change with the level. Levels beyond the exact
+    table use the coefficients of the largest level that was fitted.
+
+    If the exact table contains roots of the same level and norm, the
+    geometric mean of their multiplicities is used instead of the fit.
+    Real roots have multiplicity 1.
+
+    Both kinds of values get their own error. The error of the geometric
+    means is the spread of the exact roots around them. The fit is only
+    used beyond the table, so its error is measured on held-out roots: the
+    fit is repeated without the larger half of the values of n of a level
+    and compared with the exact roots of these values. A level with too few
+    values of n for this uses the fit of another level, whose error is then
+    measured on all roots of the level.
+
+    Attributes:
+        algebra: The algebra of the roots
+        coefficients: The coefficients (a, b, c) of the fit of every level
+        errors: The largest relative error of the geometric means and of the
+                held-out fit for every level of the exact table
+    """
+
+
+    def __init__(self, catalog):
+        """
+        Fit the estimator to an exact root table.
+
+        Keyword arguments:
+            catalog: A Root_Catalog of the exact roots
+        """
+
+        self.algebra = catalog.algebra
+        self.coefficients = {}
+        self.errors = {}
+        self._metric = self.algebra.metric.tolist()
+
+        # The geometric mean of the multiplicities per level and norm
+        self._typical = {}
+        _spreads = {}
+        _fit_errors = {}
+        _roots_by_level = {}
+
+        for level in np.unique(catalog.vectors[:, 0]).tolist():
+            _roots = catalog.by_level(level)
+            _n = 1 - _roots.norms // 2
+            _imaginary = _n >= 1
+            _n = _n[_imaginary]
+            _logs = np.array([math.log(mult) for mult in _roots.mults[_imaginary].tolist()])
+
+            _spread = 0.0
+            for n in np.unique(_n).tolist():
+                _mean = np.mean(_logs[_n == n])
+                self._typical[(level, n)] = math.exp(_mean)
+                _spread = max(_spread, float(np.max(np.abs(np.exp(_mean - _logs[_n == n]) - 1))))
+            _spreads[level] = _spread
+
+            _features = np.column_stack((np.ones(len(_n)), np.sqrt(_n), np.log(_n)))
+            _roots_by_level[level] = (_features, _logs)
+
+            # Three different norms are needed for the three coefficients and
+            # at least one more to validate them
+            _values = np.unique(_n)
+            _held_out = max(len(_values) // 2, 1)
+            if len(_values) - _held_out < 3:
+                continue
+
+            _coefficients = np.linalg.lstsq(_features, _logs, rcond=None)[0]
+            self.coefficients[level] = tuple(_coefficients.tolist())
+
+            _train = _n < _values[-_held_out]
+            _trained = np.linalg.lstsq(_features[_train], _logs[_train], rcond=None)[0]
+            _fit_errors[level] = self._relative_error(_trained, _features[~_train], _logs[~_train])
+
+        self._fitted_levels = sorted(self.coefficients)
+        if not self._fitted_levels:
+            raise ValueError("The root table is too small to fit the multiplicity estimator.")
+
+        # A level without its own fit uses the fit of another level, which is
+        # validated on all roots of the level
+        for level, spread in _spreads.items():
+            if level not in _fit_errors:
+                _fit_errors[level] = self._relative_error(self.coefficients[self._fit_level(level)],
+                                                          *_roots_by_level[level])
+            self.errors[level] = (spread, _fit_errors[level])
+
+
+    def multiplicity(self, vector):
+        """
+        Return the approximate multiplicity of a positive vector as a float,
+        or 0 if it is the zero vector or its norm is larger than 2.
+        """
+
+        if not any(vector):
+            return 0.0
+        _norm = sum(self._metric[i][j] * vector[i] * vector[j]
+                    for i in range(len(vector)) for j in range(len(vector)))
+        if _norm > 2:
+            return 0.0
+        if _norm == 2:
+            return 1.0
+
+        _level, _n = vector[0], 1 - _norm // 2
+        _typical = self._typical.get((_level, _n))
+        if _typical is not None:
+            return _typical
+
+        a, b, c = self.coefficients[self._fit_level(_level)]
+        return math.exp(a + b * math.sqrt(_n) + c * math.log(_n))
+
+
+    def estimate(self, vectors):
+        """Return the approximate multiplicities of an array of vectors, one per row."""
+        _vectors = np.asarray(vectors, dtype=np.int64).reshape(-1, self.algebra.rank)
+        return np.array([self.multiplicity(vector) for vector in _vectors.tolist()], dtype=float)
+
+
+    def error_bound(self, level):
+        """
+        Return the largest relative error of the multiplicities of a level,
+        i.e. the larger of the errors of the geometric means and of the
+        held-out fit, or None if the exact table does not cover that level.
+        The errors are measured on the exact table and are no strict bound
+        far beyond it.
+        """
+
+        _errors = self.errors.get(level)
+        return None if _errors is None else max(_errors)
+
+
+    def write_txt_file(self, file_path_and_name, max_level, max_depth, catalog=None):
+        """
+        Write all roots up to a level and a depth with their multiplicities
+        and a column that is 1 if the multiplicity is approximate.
+
+        Keyword arguments:
+            file_path_and_name: The file that is written
+            max_level: The largest level of the roots
+            max_depth: The largest depth of the roots
+            catalog: An optional Root_Catalog, whose exact multiplicities are
+                     written instead of the estimates
+        """
+
+        _rows = []
+        for level in range(max_level + 1):
+            for depth in range(max_depth + 1):
+                _vectors = self._root_vectors(level, depth)
+                _exact = (catalog.multiplicity(_vectors).tolist() if catalog is not None
+                          else [0] * len(_vectors))
+                for vector, exact in zip(_vectors.tolist(), _exact):
+                    if exact != 0:
+                        _rows.append(",".join(map(str, vector)) + "," + str(exact) + ",0\n")
+                    else:
+                        _mult = round(self.multiplicity(vector))
+                        _rows.append(",".join(map(str, vector)) + "," + str(_mult) + ",1\n")
+
+        with open(file_path_and_name, "w") as f:
+            f.write("".join(_rows))
+
+
+    def _relative_error(self, coefficients, features, logs):
+        """Return the largest relative error of a fit on roots, or 0 if there are none."""
+        if len(logs) == 0:
+            return 0.0
+        return float(np.max(np.abs(np.exp(features @ np.asarray(coefficients) - logs) - 1)))
+
+
+    def _fit_level(self, level):
+        """Return the level whose fit is used for a level."""
+        _index = bisect.bisect_right(self._fitted_levels, level)
+        return self._fitted_levels[max(_index - 1, 0)]
+
+
+    def _root_vectors(self, level, depth):
+        """
+        Return the positive vectors of a level and a depth with connected
+        support and a norm of at most 2.
+
+        The norm is a quadratic polynomial in the weight w, namely
+        m w^2 + 2 q w + r, so the weights lie between its roots.
+        """
+
+        m = self._metric[2][2]
+        q = self._metric[0][2] * level + self._metric[1][2] * depth
+        r = (self._metric[0][0] * level * level + 2 * self._metric[0][1] * level * depth
+             + self._metric[1][1] * depth * depth - 2)
+
+        _discriminant = q * q - m * r
+        if _discriminant < 0:
+            return np.zeros((0, 3), dtype=np.int64)
+
+        # Widen the bounds by one against rounding errors and check the norms exactly
+        _low = max(math.floor((-q - math.sqrt(_discriminant)) / m) - 1, 0)
+        _high = math.ceil((-q + math.sqrt(_discriminant)) / m) + 1
+
+        _vectors = [[level, depth, weight] for weight in range(_low, _high + 1)
+                    if m * weight * weight + 2 * q * weight + r <= 0
+                    and (level, depth, weight) != (0, 0, 0)
+                    and not (depth == 0 and level != 0 and weight != 0)]
+
+        return np.array(_vectors, dtype=np.int64).reshape(-1, 3)
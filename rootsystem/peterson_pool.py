@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class evaluates the Peterson formula for the roots of one height
+in a pool of worker processes.
+"""
+
+import multiprocessing
+import numpy as np
+from .root import Root
+from .root_profiler import Root_Profiler
+
+
+def _estimated_cost(root):
+    """
+    Estimate the cost of the Peterson formula for a root by the number
+    of lattice points below it, which bounds the number of matching pairs.
+    """
+
+    return int(np.prod(root.vector + 1))
+
+
+def _worker(root_system_class, algebra, engine, storage, enumeration, connection, tasks, results):
+    """
+    The main loop of a worker process.
+
+    Every worker keeps its own copy of the finished heights. New heights
+    arrive through the connection of the worker. On a "run" message the
+    worker takes tasks from the shared queue until it gets None and then
+    reports back through its connection with the counters of its work.
+    Errors are sent back as results.
+    """
+
+    _root_system = root_system_class(algebra, engine=engine, storage=storage, enumeration=enumeration)
+
+    while True:
+        _message = connection.recv()
+
+        if _message[0] == "height":
+            _root_system._install_height(*_message[1:])
+        elif _message[0] == "run":
+            _root_system._extend_co_mult_scale(_message[1])
+            _profiler = Root_Profiler(progress=False)
+            _profiler.start_height(_message[1])
+            _root_system._profiler = _profiler
+            for index, vector, co_mult in iter(tasks.get, None):
+                try:
+                    results.put((index, _root_system._calculate_mult(Root(vector), co_mult)))
+                except Exception as error:
+                    results.put((index, error))
+            _root_system._profiler = None
+            _profiler.finish_height()
+            _counters = {metric: amount for metric, amount in _profiler.records[-1].items()
+                         if metric in Root_Profiler.COUNTERS and amount != 0}
+            connection.send(("done", _counters))
+        else:
+            return
+
+
+class Peterson_Pool:
+    """
+    A pool of worker processes that calculate root multiplicities
+    with the Peterson formula.
+
+    The finished heights are shipped to every worker once, so the tasks
+    only contain the root vector and its co-multiplicity.
+
+    Every height costs a round trip to all workers, so heights with fewer
+    than min_roots roots are cheaper to evaluate in the main process.
+
+    Attributes:
+        workers: The number of worker processes
+        min_roots: The smallest number of roots of a height that is worth
+                   the pool, MIN_ROOTS_PER_WORKER roots per worker
+        counters: The counters of Root_Profiler, e.g. the pairs scanned,
+                  summed over the workers for the last call of calculate_mults
+    """
+
+
+    # The smallest number of roots per worker that is worth the round trip
+    MIN_ROOTS_PER_WORKER = 2
+
+
+    def __init__(self, root_system, workers):
+        """
+        Start the worker processes for a root system.
+
+        Keyword arguments:
+            root_system: The root system whose roots are calculated
+            workers: The number of worker processes
+        """
+
+        self.workers = workers
+        self.min_roots = self.MIN_ROOTS_PER_WORKER * workers
+        self.counters = {}
+        self._shipped_height = -1
+
+        _context = multiprocessing.get_context()
+        self._tasks = _context.Queue()
+        self._results = _context.Queue()
+        self._connections = []
+        self._processes = []
+
+        for _ in range(workers):
+            _parent_connection, _child_connection = _context.Pipe()
+            _process = _context.Process(target=_worker,
+                                        args=(type(root_system), root_system.algebra, root_system.engine,
+                                              root_system.storage, root_system.enumeration, _child_connection,
+                                              self._tasks, self._results),
+                                        daemon=True)
+            _process.start()
+            self._connections.append(_parent_connection)
+            self._processes.append(_process)
+
+
+    def ship(self, root_system):
+        """Send all finished heights that the workers do not have yet."""
+
+        for height in range(self._shipped_height + 1, root_system.constructed_height() + 1):
+            _message = ("height", height, root_system.root_system[height],
+                        root_system._root_multiples[height], root_system.co_mult_scale)
+            for connection in self._connections:
+                connection.send(_message)
+
+        self._shipped_height = root_system.constructed_height()
+
+
+    def calculate_mults(self, height, roots):
+        """
+        Calculate the multiplicities of roots of the given height whose
+        co_mult holds the co-multiplicity without their own multiplicity.
+        Returns the multiplicities in the order of the roots.
+        """
+
+        self.counters = {}
+        if len(roots) == 0:
+            return []
+
+        for connection in self._connections:
+            connection.send(("run", height))
+
+        # Hand out the most expensive roots first,
+        # such that the workers finish at roughly the same time
+        _order = sorted(range(len(roots)), key=lambda i: _estimated_cost(roots[i]), reverse=True)
+        for index in _order:
+            self._tasks.put((index, roots[index].vector, roots[index].co_mult))
+        for _ in range(self.workers):
+            self._tasks.put(None)
+
+        _mults = [0] * len(roots)
+        for _ in range(len(roots)):
+            _index, _mult = self._results.get()
+            _mults[_index] = _mult
+
+        # Wait until every worker took its None from the queue,
+        # such that no worker takes the tasks of the next height too early
+        for connection in self._connections:
+            for metric, amount in connection.recv()[1].items():
+                self.counters[metric] = self.counters.get(metric, 0) + amount
+
+        for mult in _mults:
+            if isinstance(mult, Exception):
+                raise mult
+
+        return _mults
+
+
+    def close(self):
+        """Stop the worker processes."""
+
+        for connection in self._connections:
+            connection.send(("stop",))
+        for process in self._processes:
+            process.join()
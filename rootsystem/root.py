@@ -18,9 +18,14 @@
 # along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
 #
 #
-# This class is an exact copy of the Root class from the SimpLie programm
+# This class is based on the Root class from the SimpLie programm
 # written by Teake Nutma, which is available at
 # https://github.com/teake/simplie.
+#
+# Changes from the original:
+# - Roots carry a packed integer key of their root vector, which is
+#   also used as their hash
+# - Roots use __slots__ to reduce their memory footprint
 
 """
 VisualLie is a web app to visualize the root system of the Feingold-Frenkel
@@ -34,17 +39,101 @@ This class store root information.
 
 import numpy as np
 
+# The base in which root vectors are packed into integer keys. It is odd,
+# such that the low bits of a key, which select the bucket in a hash table,
+# depend on every component. Components have to be smaller than half the
+# base. Three components fit into an int64.
+KEY_BASE = 1000003
+_KEY_LIMIT = (KEY_BASE + 1) // 2
+
+# The largest rank of the root vectors whose keys fit into an int64
+MAX_RANK = 3
+
+
+def pack_vector(vector):
+    """
+    Pack a root vector into a single integer key.
+    
+    The key is the number with the digits given by the vector in base
+    KEY_BASE, the first component being the lowest digit. Keys are linear,
+    i.e. the key of a sum is the sum of the keys. Since the digits of a key
+    are unique if they lie between -KEY_BASE/2 and KEY_BASE/2, the difference
+    of two keys never matches the key of a root if the difference of the
+    vectors has a negative component. Returns None if the vector cannot
+    be packed.
+    """
+    
+    _key = 0
+    for component in reversed(vector.tolist() if isinstance(vector, np.ndarray) else vector):
+        if component < 0 or component >= _KEY_LIMIT:
+            return None
+        _key = _key * KEY_BASE + int(component)
+    
+    return _key
+
+
+def pack_vectors(vectors):
+    """
+    Pack the rows of an array of root vectors into integer keys at once,
+    like pack_vector. Returns an int64 array, which is -1 for every
+    vector that cannot be packed. Raises a ValueError if the vectors have
+    more than MAX_RANK components, whose keys would overflow.
+    """
+    
+    _vectors = np.asarray(vectors, dtype=np.int64)
+    if _vectors.ndim == 2 and _vectors.shape[1] > MAX_RANK:
+        raise ValueError("Root vectors with more than " + str(MAX_RANK) + " components can not be packed.")
+    _keys = np.zeros(len(_vectors), dtype=np.int64)
+    for i in reversed(range(_vectors.shape[1])):
+        _keys = _keys * KEY_BASE + _vectors[:, i]
+        
+    _valid = np.all((_vectors >= 0) & (_vectors < _KEY_LIMIT), axis=1)
+    _keys[~_valid] = -1
+    
+    return _keys
+
+
+def unpack_key(key, rank):
+    """Unpack an integer key into a root vector of the given rank."""
+    _vector = np.zeros(rank, dtype=int)
+    
+    for i in range(rank):
+        key, _vector[i] = divmod(key, KEY_BASE)
+        
+    return _vector
+
+
+def legacy_hash(vector):
+    """
+    Return the shift/XOR hash of the original SimpLie Root class.
+    
+    It is only kept to compare hash statistics with the packed keys.
+    """
+    
+    _hash_val = 0
+    for component in vector:
+        _hash_val <<= 1
+        if _hash_val < 0:
+            _hash_val |= 1
+        _hash_val ^= int(component)
+        
+    return _hash_val
+
+
 class Root:
     """
     A class for storing root information.
     
     Attributes:
-        vector: The oot vector
+        vector: The root vector
+        key: The packed integer key of the root vector
         mult: The root multiplicity
         co_mult: The co-multiplicity of the root
         norm: The norm of the root
     """
     
+    __slots__ = ("vector", "key", "mult", "co_mult", "norm")
+    
     def __init__(self, root_vector):
         """
         Initialize a new root from a given root vector.
@@ -54,6 +143,7 @@ class Root:
         """
         
         self.vector = root_vector.copy()
+        self.key = pack_vector(self.vector)
         self.mult = 0
         self.co_mult = None
         self.norm = 0
@@ -121,16 +211,7 @@ class Root:
     
     def __hash__(self):
         """Return a hashcode based on the vector of the root."""
-        _hash_val = 0
-        _length = len(self.vector)
-    
-        for i in range(_length):
-            # Left shift hash value by 1
-            _hash_val <<= 1
-            if _hash_val < 0:
-                # Set the least significant bit to 1
-                _hash_val |= 1
-            # XOR with the current element
-            _hash_val ^= self.vector[i]
-    
-        return int(_hash_val)
\ No newline at end of file
+        if self.key is not None:
+            return hash(self.key)
+        
+        return hash(tuple(self.vector.tolist()))
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class constructs the root systems of many algebras in one job, spread
+over a pool of worker processes.
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from .kac_moody_algebra import Kac_Moody_Algebra
+from .root_store import Root_Store
+from .root_system import Root_System
+
+
+def _construct(task):
+    """
+    Construct the root system of one algebra and write its root table.
+    Runs in a worker process and returns the summary of the algebra.
+    """
+
+    _algebra, _height, _settings, _directory = task
+    _start = time.perf_counter()
+
+    _root_system = Root_System(_algebra, **_settings)
+    _root_system.construct(_height)
+
+    _txt_file = os.path.join(_directory, _algebra.name + ".txt")
+    _store_file = os.path.join(_directory, _algebra.name + ".bin")
+    _root_system.write_txt_file(_txt_file)
+    _root_system.write_store(_store_file)
+
+    return {"name": _algebra.name, "cartan_matrix": _algebra.cartan_matrix.tolist(),
+            "d": _algebra.d.diagonal().tolist(), "type": _algebra.type,
+            "height": _root_system.constructed_height(), "roots": len(Root_Store(_store_file)),
+            "enumeration": _settings["enumeration"], "seconds": time.perf_counter() - _start}
+
+
+class Root_Batch:
+    """
+    A batch of algebras whose root systems are constructed up to a common
+    height with the same settings.
+
+    Every algebra is validated and its metric, type and Weyl denominator
+    terms are computed once in the main process. The algebra is then handed
+    to one worker process together with these tables, and the worker
+    constructs its whole root system. The algebras are independent, so the
+    pool stays busy without any communication between the workers.
+
+    The root table of an algebra is written to the directory of the batch
+    as NAME.txt and as the Root_Store NAME.bin, where NAME is the name of
+    the algebra. The summaries of all algebras are written to algebras.jsonl
+    as one line of JSON per algebra.
+
+    The lattice enumeration only works for finite, affine and hyperbolic
+    algebras. The root systems of all other algebras are enumerated by
+    their root strings.
+
+    Attributes:
+        algebras: The algebras of the batch
+        directory: The directory of the root tables
+        settings: The keyword arguments of Root_System
+        workers: The number of worker processes
+    """
+
+
+    def __init__(self, algebras, directory="data/batch", engine="join", storage="objects", closed_forms="on",
+                 enumeration="lattice", workers=None):
+        """
+        Initialize a new batch.
+
+        Keyword arguments:
+            algebras: The algebras, either Kac_Moody_Algebras or Cartan matrices
+            directory: The directory of the root tables
+            engine: The Peterson engine, one of Root_System.ENGINES
+            storage: The storage mode, one of Root_System.STORAGES
+            closed_forms: The use of the closed forms, one of Root_System.CLOSED_FORMS
+            enumeration: The enumeration of the finite, affine and hyperbolic
+                         algebras, one of Root_System.ENUMERATIONS
+            workers: The number of worker processes, by default the number of CPUs
+        """
+
+        self.algebras = [algebra if isinstance(algebra, Kac_Moody_Algebra) else Kac_Moody_Algebra(algebra)
+                         for algebra in algebras]
+        _names = [algebra.name for algebra in self.algebras]
+        _duplicates = sorted({name for name in _names if _names.count(name) > 1})
+        if _duplicates:
+            raise ValueError("The names of the algebras are not unique: " + ", ".join(_duplicates))
+
+        self.directory = directory
+        self.settings = {"engine": engine, "storage": storage, "closed_forms": closed_forms,
+                         "enumeration": enumeration}
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+
+
+    @classmethod
+    def from_json_file(cls, file_path_and_name, **kwargs):
+        """
+        Create a batch from a JSON file with a list of algebras. Every entry is
+        either a Cartan matrix or an object with the keys "cartan_matrix" and
+        the optional keys "d" and "name", see Kac_Moody_Algebra.
+
+        Keyword arguments:
+            file_path_and_name: The JSON file of the algebras
+            kwargs: The other arguments of Root_Batch
+        """
+
+        with open(file_path_and_name) as f:
+            _entries = json.load(f)
+
+        _algebras = []
+        for entry in _entries:
+            if isinstance(entry, dict):
+                _algebras.append(Kac_Moody_Algebra(entry["cartan_matrix"], d=entry.get("d"), name=entry.get("name")))
+            else:
+                _algebras.append(Kac_Moody_Algebra(entry))
+
+        return cls(_algebras, **kwargs)
+
+
+    def run(self, height, progress=True):
+        """
+        Construct the root systems of all algebras up to a height and write
+        their root tables. Returns the summaries of the algebras in the
+        order of the batch.
+
+        Keyword arguments:
+            height: The height up to which the root systems are constructed
+            progress: If True, print a line whenever an algebra is finished
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        _tasks = []
+        for algebra in self.algebras:
+            _settings = dict(self.settings)
+            if algebra.type == "indefinite" and _settings["storage"] != "dominant":
+                _settings["enumeration"] = "strings"
+            # The denominator terms up to the height are computed once instead
+            # of being extended at every height of the construction
+            if _settings["engine"] == "denominator":
+                algebra.weyl_denominator(height)
+            _tasks.append((algebra, height, _settings, self.directory))
+
+        _summaries = {}
+        _context = multiprocessing.get_context()
+        with _context.Pool(min(self.workers, len(_tasks)) or 1) as _pool:
+            for summary in _pool.imap_unordered(_construct, _tasks):
+                _summaries[summary["name"]] = summary
+                if progress:
+                    print("Constructed " + summary["name"] + " (" + summary["type"] + ") up to height "
+                          + str(summary["height"]) + ": " + str(summary["roots"]) + " roots in "
+                          + str(round(summary["seconds"], 2)) + " seconds")
+
+        _summaries = [_summaries[algebra.name] for algebra in self.algebras]
+        with open(os.path.join(self.directory, "algebras.jsonl"), "w") as f:
+            for summary in _summaries:
+                f.write(json.dumps(summary) + "\n")
+
+        return _summaries
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class answers queries on a finished root table with array operations.
+"""
+
+import numpy as np
+from .root import pack_vectors
+from .root_store import Root_Store
+
+
+class Root_Catalog:
+    """
+    A read-only table of roots that can be queried in batches.
+
+    The rows are sorted lexicographically by the root vectors, i.e. by
+    level, depth and weight, such that the roots of a level up to a depth
+    are one contiguous block.
+
+    Attributes:
+        algebra: The algebra of the roots
+        vectors: The root vectors, one per row
+        mults: The root multiplicities. They are an object array of Python
+               ints if any of them does not fit into 64 bits.
+        norms: The norms of the roots
+    """
+
+
+    def __init__(self, algebra, vectors, mults):
+        """
+        Initialize a new catalog from arrays of root vectors and multiplicities.
+
+        Keyword arguments:
+            algebra: The algebra of the roots, used for the norms
+            vectors: The root vectors, one per row
+            mults: The root multiplicities
+        """
+
+        self.algebra = algebra
+
+        _vectors = np.asarray(vectors, dtype=np.int64).reshape(-1, algebra.rank)
+        _order = np.lexsort(_vectors.T[::-1])
+        self.vectors = _vectors[_order]
+        self.mults = np.array(list(mults), dtype=object)[_order]
+        if all(mult <= np.iinfo(np.int64).max for mult in self.mults.tolist()):
+            self.mults = self.mults.astype(np.int64)
+        self.norms = np.einsum("ij,jk,ik->i", self.vectors, algebra.metric, self.vectors)
+
+        # The keys are not sorted by the rows, so keep a sorted copy for the lookups
+        _keys = pack_vectors(self.vectors)
+        self._key_order = np.argsort(_keys, kind="stable")
+        self._sorted_keys = _keys[self._key_order]
+
+
+    @classmethod
+    def from_root_system(cls, root_system):
+        """Create a catalog of all roots that a Root_System has constructed so far."""
+        _vectors, _mults = [np.zeros((0, root_system.rank), dtype=np.int64)], []
+        for height in range(1, root_system.constructed_height() + 1):
+            _height_vectors, _height_mults = root_system._height_rows(height)
+            _vectors.append(_height_vectors)
+            _mults += _height_mults
+
+        return cls(root_system.algebra, np.concatenate(_vectors), _mults)
+
+
+    @classmethod
+    def from_txt_file(cls, algebra, file_path_and_name):
+        """
+        Create a catalog from a text file written by Root_System.write_txt_file.
+
+        Keyword arguments:
+            algebra: The algebra of the roots
+            file_path_and_name: The file with one root vector and its multiplicity per row
+        """
+
+        # Read the rows as Python ints, such that huge multiplicities stay exact
+        with open(file_path_and_name) as f:
+            _rows = [[int(x) for x in line.split(",")] for line in f
+                     if line.strip() and not line.startswith("#")]
+
+        return cls(algebra, [row[:-1] for row in _rows], [row[-1] for row in _rows])
+
+
+    @classmethod
+    def from_store(cls, algebra, file_path_and_name, max_level=None, max_depth=None):
+        """
+        Create a catalog from a binary file written by Root_Store.write.
+
+        Keyword arguments:
+            algebra: The algebra of the roots
+            file_path_and_name: The binary root table
+            max_level: If given, only the roots up to this level are read
+            max_depth: If given, only the roots up to this depth are read
+        """
+
+        _store = Root_Store(file_path_and_name)
+        _vectors, _mults = _store.window(_store.levels if max_level is None else max_level,
+                                         _store.depths if max_depth is None else max_depth)
+
+        return cls(algebra, _vectors, _mults.tolist())
+
+
+    def __len__(self):
+        """Return the number of roots in the catalog."""
+        return len(self.vectors)
+
+
+    def multiplicity(self, vectors):
+        """
+        Return the multiplicities of an array of vectors, one per row.
+        The multiplicity is 0 for every vector that is not in the catalog.
+        """
+
+        _keys = pack_vectors(np.asarray(vectors).reshape(-1, self.algebra.rank))
+        _mults = np.zeros(len(_keys), dtype=self.mults.dtype)
+        if len(self._sorted_keys) == 0:
+            return _mults
+
+        _positions = np.minimum(np.searchsorted(self._sorted_keys, _keys), len(self._sorted_keys) - 1)
+        _found = (self._sorted_keys[_positions] == _keys) & (_keys >= 0)
+        _mults[_found] = self.mults[self._key_order[_positions[_found]]]
+
+        return _mults
+
+
+    def by_level(self, level, max_depth=None):
+        """
+        Return a catalog of the roots of a level, optionally only up to a depth.
+
+        Keyword arguments:
+            level: The level of the roots
+            max_depth: The largest depth of the roots, or None for all depths
+        """
+
+        _start, _stop = self._level_rows(level)
+        if max_depth is not None:
+            _stop = _start + np.searchsorted(self.vectors[_start:_stop, 1], max_depth, side="right")
+
+        return self._subset(np.arange(_start, _stop))
+
+
+    def by_norm(self, level, norm):
+        """
+        Return a catalog of the roots of a level with the given norm.
+
+        Keyword arguments:
+            level: The level of the roots
+            norm: The norm of the roots
+        """
+
+        _start, _stop = self._level_rows(level)
+        _rows = _start + np.nonzero(self.norms[_start:_stop] == norm)[0]
+
+        return self._subset(_rows)
+
+
+    def grid(self, level, max_depth=None, max_weight=None):
+        """
+        Return the multiplicities of a level as a dense array, whose entry
+        (depth, weight) is the multiplicity of the root (level, depth, weight),
+        or 0 if that vector is not in the catalog.
+
+        Keyword arguments:
+            level: The level of the roots
+            max_depth: The largest depth of the grid, by default the largest depth of the level
+            max_weight: The largest weight of the grid, by default the largest weight of the level
+        """
+
+        _roots = self.by_level(level, max_depth)
+        _depths, _weights = _roots.vectors[:, 1], _roots.vectors[:, 2]
+
+        if max_depth is None:
+            max_depth = int(_depths.max(initial=-1))
+        if max_weight is None:
+            max_weight = int(_weights.max(initial=-1))
+
+        _grid = np.zeros((max_depth + 1, max_weight + 1), dtype=self.mults.dtype)
+        _keep = _weights <= max_weight
+        _grid[_depths[_keep], _weights[_keep]] = _roots.mults[_keep]
+
+        return _grid
+
+
+    def _level_rows(self, level):
+        """Return the first row of a level and the first row after it."""
+        _levels = self.vectors[:, 0]
+        return (int(np.searchsorted(_levels, level, side="left")),
+                int(np.searchsorted(_levels, level, side="right")))
+
+
+    def _subset(self, rows):
+        """Return a catalog of the given rows."""
+        return Root_Catalog(self.algebra, self.vectors[rows], self.mults[rows].tolist())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class stores all roots of one height in NumPy arrays.
+"""
+
+import os
+import numpy as np
+from collections.abc import Mapping
+from .root import Root
+
+
+def _integer_array(values):
+    """
+    Return the values as an int64 array, or as an object array
+    if they do not fit into 64 bits.
+    """
+
+    try:
+        return np.array(values, dtype=np.int64)
+    except OverflowError:
+        return np.array(values, dtype=object)
+
+
+class Root_Layer(Mapping):
+    """
+    A read-only mapping from packed root keys to roots that stores the roots
+    of one height as a structure of arrays.
+
+    The rows are sorted lexicographically by the root vectors. Accessing a
+    root returns a new Root with the data of its row.
+
+    Attributes:
+        vectors: The root vectors, one per row
+        keys: The packed keys of the root vectors
+        norms: The norms of the roots
+        dynkin_labels: The Dynkin labels of the roots, one per row
+        mults: The root multiplicities
+        co_mults: The co-multiplicities of the roots
+    """
+
+
+    # The arrays of a layer that are written by save
+    _ARRAYS = ("vectors", "keys", "norms", "dynkin_labels", "mults", "co_mults", "_key_order", "_sorted_keys")
+
+
+    def __init__(self, vectors, keys, norms, dynkin_labels, mults, co_mults, key_order=None):
+        """
+        Initialize a new layer from arrays that are sorted by the root vectors.
+        The order of the sorted keys is computed if it is not given.
+        """
+
+        self.vectors = vectors
+        self.keys = keys
+        self.norms = norms
+        self.dynkin_labels = dynkin_labels
+        self.mults = mults
+        self.co_mults = co_mults
+
+        # The keys are not sorted, so keep a sorted copy for the lookups
+        self._key_order = np.argsort(keys, kind="stable") if key_order is None else key_order
+        self._sorted_keys = keys[self._key_order]
+
+
+    @classmethod
+    def from_roots(cls, algebra, roots):
+        """
+        Create a layer from an iterable of roots.
+
+        Keyword arguments:
+            algebra: The algebra of the roots, used for the Dynkin labels
+            roots: The roots to store in the layer
+        """
+
+        _roots = list(roots)
+        _vectors = np.array([root.vector.tolist() for root in _roots], dtype=np.int64)
+        _vectors = _vectors.reshape(len(_roots), algebra.rank)
+
+        # Sort the roots lexicographically by their root vectors
+        _order = np.lexsort(_vectors.T[::-1]) if len(_roots) > 0 else np.zeros(0, dtype=int)
+        _roots = [_roots[i] for i in _order]
+        _vectors = _vectors[_order]
+
+        return cls(_vectors,
+                   np.array([root.key for root in _roots], dtype=np.int64),
+                   np.array([int(root.norm) for root in _roots], dtype=np.int64),
+                   np.dot(_vectors, algebra.cartan_matrix),
+                   _integer_array([int(root.mult) for root in _roots]),
+                   np.array([root.co_mult for root in _roots], dtype=object))
+
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Load a layer that was written by save. The int64 arrays are
+        memory-mapped read-only, only the object arrays are read into memory.
+        """
+
+        _arrays = {}
+        for name in cls._ARRAYS:
+            _file = os.path.join(directory, name.lstrip("_") + ".npy")
+            if os.path.exists(_file):
+                _arrays[name] = np.load(_file, mmap_mode="r")
+            else:
+                _arrays[name] = np.load(os.path.join(directory, name.lstrip("_") + ".pkl.npy"), allow_pickle=True)
+
+        _layer = cls(_arrays["vectors"], _arrays["keys"], _arrays["norms"], _arrays["dynkin_labels"],
+                     _arrays["mults"], _arrays["co_mults"], key_order=_arrays["_key_order"])
+        _layer._sorted_keys = _arrays["_sorted_keys"]
+
+        return _layer
+
+
+    def save(self, directory):
+        """
+        Write the arrays of the layer to a directory. Arrays of int64 are
+        written as plain .npy files, which load can memory-map, and arrays
+        of Python ints as pickled .pkl.npy files.
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        for name in self._ARRAYS:
+            _array = getattr(self, name)
+            _file = os.path.join(directory, name.lstrip("_") + ".npy")
+            # An array that is memory-mapped from its file is already written
+            if isinstance(_array, np.memmap) and _array.filename == os.path.abspath(_file):
+                continue
+            if _array.dtype == object:
+                np.save(os.path.join(directory, name.lstrip("_") + ".pkl.npy"), _array, allow_pickle=True)
+            else:
+                np.save(_file, _array, allow_pickle=False)
+
+
+    def __len__(self):
+        """Return the number of roots in the layer."""
+        return len(self.keys)
+
+
+    def __iter__(self):
+        """Iterate over the packed keys in the order of the rows."""
+        return iter(self.keys.tolist())
+
+
+    def __contains__(self, key):
+        """Check if a root with the given packed key is in the layer."""
+        return self.find(key) >= 0
+
+
+    def __getitem__(self, key):
+        """Return the root with the given packed key."""
+        _row = self.find(key)
+        if _row < 0:
+            raise KeyError(key)
+        return self.root(_row)
+
+
+    def get(self, key, default=None):
+        """Return the root with the given packed key or the default."""
+        _row = self.find(key)
+        if _row < 0:
+            return default
+        return self.root(_row)
+
+
+    def values(self):
+        """Return the roots in the order of the rows."""
+        return [self.root(row) for row in range(len(self.keys))]
+
+
+    def items(self):
+        """Return the pairs of packed keys and roots in the order of the rows."""
+        return list(zip(self.keys.tolist(), self.values()))
+
+
+    def find(self, key):
+        """Return the row of the root with the given packed key, or -1."""
+        if key is None or len(self._sorted_keys) == 0:
+            return -1
+
+        _position = np.searchsorted(self._sorted_keys, key)
+        if _position < len(self._sorted_keys) and self._sorted_keys[_position] == key:
+            return int(self._key_order[_position])
+
+        return -1
+
+
+    def find_all(self, keys):
+        """
+        Return the rows of the roots with the given packed keys.
+        The row is -1 for every key that is not in the layer.
+        """
+
+        _rows = np.full(len(keys), -1, dtype=np.int64)
+        if len(self._sorted_keys) == 0:
+            return _rows
+
+        _positions = np.searchsorted(self._sorted_keys, keys)
+        _positions = np.minimum(_positions, len(self._sorted_keys) - 1)
+        _found = self._sorted_keys[_positions] == keys
+        _rows[_found] = self._key_order[_positions[_found]]
+
+        return _rows
+
+
+    def root(self, row):
+        """Return a Root with the data of the given row."""
+        _root = Root(self.vectors[row])
+        _root.mult = int(self.mults[row])
+        _root.co_mult = self.co_mults[row]
+        _root.norm = int(self.norms[row])
+
+        return _root
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class predicts the time and the memory of a construction from a cheap
+construction of the low heights and chooses the settings of the construction.
+"""
+
+import os
+import time
+import tracemalloc
+import numpy as np
+from .root_system import Root_System
+
+
+class Root_Planner:
+    """
+    A cost model of the construction of a root system.
+
+    The number of roots of every height and the orbit representatives, whose
+    multiplicities need the Peterson formula or the denominator identity, are
+    counted exactly from the lattice vectors. The work of these evaluations
+    depends on the engine:
+        scan: the pairs of roots of complementary heights
+        join: the roots of the lower half of the heights
+        modular: the lattice vectors below the root, for the Peterson formula
+                 and also for every engine in the dominant storage mode
+        denominator: the terms of the denominator identity below the root
+    Every combination of engine and storage mode is probed up to a low height,
+    apart from the scan engine, which does the same work as the join engine
+    without the hash index, so it is always slower.
+    The time of every height is fitted by c_1 work + c_2 roots and the memory
+    by d_1 stored + d_2 stored * height, where stored is the number of stored
+    roots up to that height and the second term accounts for the growing
+    integers.
+
+    With workers the Peterson part of the time is divided by the number of
+    workers, but every worker keeps its own copy of the root table.
+
+    Attributes:
+        algebra: The algebra of the root system
+        probe_height: The height up to which the settings are probed
+        closed_forms: The use of the closed forms in the construction
+        region: The Root_Region of the construction, or None
+    """
+
+
+    def __init__(self, algebra, probe_height=40, closed_forms="on", region=None):
+        """
+        Initialize a new planner.
+
+        Keyword arguments:
+            algebra: The algebra of the root system
+            probe_height: The height up to which the settings are probed
+            closed_forms: The use of the closed forms in the construction
+            region: An optional Root_Region of the construction
+        """
+
+        self.algebra = algebra
+        self.probe_height = probe_height
+        self.closed_forms = closed_forms
+        self.region = region
+
+        self._counts = {}
+        self._models = {}
+        self._memory_models = {}
+
+
+    def settings(self, max_workers=None):
+        """
+        Return all settings that the planner compares, as dictionaries
+        with an engine, a storage mode and a number of workers.
+        """
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+
+        _settings = []
+        for engine in Root_System.ENGINES:
+            if engine == "scan":
+                continue
+            for storage in Root_System.STORAGES:
+                # The modular engine does not use the worker pool
+                for workers in sorted({1, max_workers} if engine != "modular" else {1}):
+                    _settings.append({"engine": engine, "storage": storage, "workers": workers})
+
+        return _settings
+
+
+    def predict(self, max_height, setting):
+        """
+        Predict the construction up to a height with a setting.
+
+        Returns a list with one dictionary per height, which contains the
+        number of roots of the height, the predicted time of the height and
+        the predicted time and memory of the construction up to the height.
+
+        Keyword arguments:
+            max_height: The height up to which the root system is constructed
+            setting: A dictionary with an engine, a storage mode and a number of workers
+        """
+
+        _time_model, _memory_model = self._model(setting["engine"], setting["storage"])
+        _workers = setting["workers"]
+
+        _rows = []
+        _total_time = 0.0
+        _stored = 0
+        for height in range(2, max_height + 1):
+            _counts = self._height_counts(height)
+            _work = self._work(setting["engine"], setting["storage"], height)
+            _time = _time_model[0] * _work / _workers + _time_model[1] * _counts["roots"]
+            _total_time += _time
+
+            _stored += _counts["representatives"] if setting["storage"] == "dominant" else _counts["roots"]
+            _memory = (_memory_model[0] * _stored + _memory_model[1] * _stored * height) * (1 + _workers if _workers > 1 else 1)
+            if setting["engine"] == "modular":
+                # The residues of four primes in a cube that holds the roots
+                _memory += 4 * 8 * ((height // 32 + 1) * 32)**self.algebra.rank
+
+            _rows.append({"height": height, "roots": _counts["roots"], "time": _time,
+                          "total_time": _total_time, "memory": _memory})
+
+        return _rows
+
+
+    def plan(self, max_height, time_budget=None, memory_budget=None, max_workers=None):
+        """
+        Choose the fastest setting for a construction that fits into the
+        given budgets. If no setting fits, the setting with the least memory
+        is chosen if the memory budget is exceeded, and the fastest otherwise.
+
+        Returns the setting as a dictionary with an engine, a storage mode and a
+        number of workers, together with its predicted time and memory and
+        whether it fits into the budgets.
+
+        Keyword arguments:
+            max_height: The height up to which the root system is constructed
+            time_budget: The largest time of the construction in seconds, or None
+            memory_budget: The largest memory of the construction in bytes, or None
+            max_workers: The largest number of workers, by default the number of CPUs
+        """
+
+        _candidates = []
+        for setting in self.settings(max_workers):
+            _rows = self.predict(max_height, setting)
+            _time = _rows[-1]["total_time"] if _rows else 0.0
+            _memory = max((row["memory"] for row in _rows), default=0.0)
+            _fits_time = time_budget is None or _time <= time_budget
+            _fits_memory = memory_budget is None or _memory <= memory_budget
+            _candidates.append(dict(setting, time=float(_time), memory=float(_memory), fits=_fits_time and _fits_memory,
+                                    fits_memory=_fits_memory))
+
+        _fitting = [candidate for candidate in _candidates if candidate["fits"]]
+        if _fitting:
+            _best = min(_fitting, key=lambda candidate: candidate["time"])
+        elif not any(candidate["fits_memory"] for candidate in _candidates):
+            _best = min(_candidates, key=lambda candidate: (candidate["memory"], candidate["time"]))
+        else:
+            _best = min((candidate for candidate in _candidates if candidate["fits_memory"]),
+                        key=lambda candidate: candidate["time"])
+
+        del _best["fits_memory"]
+        return _best
+
+
+    def print_prediction(self, max_height, setting):
+        """Print the predicted time and memory of every height as a table."""
+
+        print("height,roots,seconds,total_seconds,memory_mb")
+        for row in self.predict(max_height, setting):
+            print(",".join([str(row["height"]), str(row["roots"]), str(round(row["time"], 3)),
+                            str(round(row["total_time"], 1)), str(round(row["memory"] / 2**20, 1))]))
+
+
+    def _model(self, engine, storage):
+        """Return the fitted time and memory coefficients of an engine and a storage mode."""
+
+        if (engine, storage) not in self._models:
+            self._models[(engine, storage)] = self._probe_time(engine, storage)
+        if storage not in self._memory_models:
+            self._memory_models[storage] = self._probe_memory(storage)
+
+        return self._models[(engine, storage)], self._memory_models[storage]
+
+
+    def _probe_time(self, engine, storage):
+        """Construct the low heights with a setting and fit the time model to them."""
+
+        _root_system = Root_System(self.algebra, engine=engine, storage=storage, closed_forms=self.closed_forms)
+        _times = {}
+        _start = time.perf_counter()
+        for height, _, _ in _root_system.construct_iter(self.probe_height, region=self.region):
+            _times[height] = time.perf_counter() - _start
+            _start = time.perf_counter()
+
+        # Only the upper half of the heights is fitted, the lower
+        # heights are too fast to be measured reliably
+        _heights = [height for height in _times if height > self.probe_height // 2]
+        _features = np.array([[self._work(engine, storage, height), self._height_counts(height)["roots"]]
+                              for height in _heights], dtype=float)
+
+        return self._fit(_features, np.array([_times[height] for height in _heights]))
+
+
+    def _probe_memory(self, storage):
+        """
+        Construct the low heights with a storage mode and fit the memory model
+        to them. The stored roots hardly depend on the engine, so the fastest
+        engine is used.
+        """
+
+        tracemalloc.start()
+        try:
+            _base = tracemalloc.get_traced_memory()[0]
+            _root_system = Root_System(self.algebra, engine="denominator", storage=storage,
+                                       closed_forms=self.closed_forms)
+            _root_system.construct(self.probe_height, region=self.region)
+            _memory = tracemalloc.get_traced_memory()[0] - _base
+        finally:
+            tracemalloc.stop()
+
+        _stored = sum(self._height_counts(height)["representatives" if storage == "dominant" else "roots"]
+                      for height in range(2, self.probe_height + 1))
+        _bytes = max(_memory, 0) / max(_stored * (1 + self.probe_height / 64), 1)
+
+        return (_bytes, _bytes / 64)
+
+
+    @staticmethod
+    def _fit(features, values):
+        """Fit non-negative coefficients of the features to the values."""
+
+        _coefficients = np.linalg.lstsq(features, values, rcond=None)[0]
+        if np.all(_coefficients >= 0):
+            return tuple(_coefficients.tolist())
+
+        # Fall back to the single feature that fits best
+        _best = None
+        for column in range(features.shape[1]):
+            _scale = np.dot(features[:, column], values) / max(np.dot(features[:, column], features[:, column]), 1e-30)
+            _error = np.sum((features[:, column] * max(_scale, 0) - values)**2)
+            if _best is None or _error < _best[0]:
+                _best = (_error, column, max(_scale, 0))
+
+        _coefficients = [0.0] * features.shape[1]
+        _coefficients[_best[1]] = _best[2]
+        return tuple(float(coefficient) for coefficient in _coefficients)
+
+
+    def _height_counts(self, height):
+        """
+        Count the roots of a height, the orbit representatives and the lattice
+        vectors and denominator terms below the representatives, whose
+        multiplicities are not known in closed form.
+        """
+
+        if height not in self._counts:
+            _scratch = Root_System(self.algebra)
+            if self.region is not None:
+                _scratch._set_region(self.region, height)
+
+            _representatives = [vector.tolist() for vector in _scratch._dominant_vectors(height)]
+            _peterson = [vector for vector in _representatives
+                         if self.closed_forms == "off" or self.algebra.closed_form_mult(vector) is None]
+            _deltas = self.algebra.weyl_denominator(height)[0]
+
+            self._counts[height] = {
+                "roots": len(_scratch._lattice_roots(height)[0]),
+                "representatives": len(_representatives),
+                "peterson": len(_peterson),
+                "box": sum(int(np.prod(np.array(vector) + 1)) for vector in _peterson),
+                "terms": sum(int(np.sum(np.all(_deltas <= vector, axis=1))) for vector in _peterson)}
+
+        return self._counts[height]
+
+
+    def _work(self, engine, storage, height):
+        """Return the work of the multiplicities of a height for an engine and a storage mode."""
+
+        _counts = self._height_counts(height)
+
+        if engine == "denominator":
+            return _counts["terms"]
+        if engine == "modular" or storage == "dominant":
+            return _counts["box"]
+
+        _layers = [self._height_counts(h)["roots"] if h > 1 else self.algebra.rank for h in range(1, height)]
+        if engine == "join":
+            return _counts["peterson"] * sum(_layers[:(height + 1) // 2])
+
+        return _counts["peterson"] * sum(_layers[i - 1] * _layers[height - i - 1] for i in range(1, (height + 1) // 2))
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class records what the construction of every height of a root system
+does and how long each of its phases takes.
+"""
+
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+
+
+class Root_Profiler:
+    """
+    A collector of metrics of every height of a construction.
+
+    Root_System.construct passes the metrics of every height to the profiler,
+    which keeps one record per height. The counters of a record are
+        candidates: The vectors that were considered as roots of the height
+        roots: The roots of the height that were kept
+        multiples: The root multiples of the height
+        reflected: The roots whose multiplicity was found by a reflection
+        closed_forms: The roots whose multiplicity has a closed form
+        peterson_roots: The roots whose multiplicity needs the engine
+        pairs_scanned: The pairs of vectors that the engine compared, or the
+                       lattice vectors and denominator terms it visited
+        pairs_matched: The pairs that contributed to a sum
+        products: The products of exact co-multiplicities that were summed.
+                  The co-multiplicities are scaled to integers, so these
+                  are the exact arithmetic operations of the height.
+    and the times in seconds of the phases
+        enumeration_seconds: Finding the candidates
+        co_mult_seconds: The co-multiplicities of the new roots
+        reflection_seconds: The multiplicities found by reflections
+        peterson_seconds: The multiplicities from the engine
+        multiples_seconds: The multiple index, the root multiples and storing the height
+        seconds: The whole height
+    If memory is traced, memory_peak is the peak of the traced memory in
+    bytes during the height. The counters of the worker processes of a
+    Peterson_Pool are added to the height, their time only counts as
+    the time of the height.
+
+    Attributes:
+        records: The records of all finished heights
+    """
+
+    # The counters and times of a record, in the order they are written
+    COUNTERS = ("candidates", "roots", "multiples", "reflected", "closed_forms", "peterson_roots",
+                "pairs_scanned", "pairs_matched", "products")
+    METRICS = COUNTERS + ("enumeration_seconds", "co_mult_seconds", "reflection_seconds", "peterson_seconds",
+                          "multiples_seconds", "seconds")
+
+
+    def __init__(self, file_path_and_name=None, progress=True, trace_memory=False,
+                 profile_heights=None, profile_file_path_and_name="data/profile.prof"):
+        """
+        Initialize a new profiler.
+
+        Keyword arguments:
+            file_path_and_name: An optional JSON lines file, to which
+                                every record is written when it is finished
+            progress: If True, print a progress line with the estimated
+                      remaining time after every height
+            trace_memory: If True, trace the peak memory of every height.
+                          This slows down the construction considerably.
+            profile_heights: An optional range of heights (first, last),
+                             which are run under cProfile
+            profile_file_path_and_name: The file of the cProfile statistics
+        """
+
+        self.file_path_and_name = file_path_and_name
+        self.progress = progress
+        self.trace_memory = trace_memory
+        self.profile_heights = profile_heights
+        self.profile_file_path_and_name = profile_file_path_and_name
+        self.records = []
+
+        self._file = None
+        self._profile = None
+        self._record = None
+        self._max_height = 0
+        self._start_time = None
+        self._height_start = None
+        self._tracing = False
+
+
+    def start(self, max_height):
+        """Start the construction up to a height, which is 0 if there is no limit."""
+
+        self._max_height = max_height
+        self._start_time = time.perf_counter()
+        if self.file_path_and_name is not None and self._file is None:
+            self._file = open(self.file_path_and_name, "a")
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+
+    def start_height(self, height):
+        """Start a new record for a height."""
+
+        self._record = {"height": height}
+        self._record.update(dict.fromkeys(self.METRICS, 0))
+        self._height_start = time.perf_counter()
+
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        if self.profile_heights is not None and self.profile_heights[0] <= height <= self.profile_heights[1]:
+            if self._profile is None:
+                self._profile = cProfile.Profile()
+            self._profile.enable()
+
+
+    def add(self, metric, amount):
+        """Add an amount to a metric of the current height."""
+        if self._record is not None:
+            self._record[metric] += amount
+
+
+    def finish_height(self):
+        """Finish the record of the current height, write it and print the progress."""
+
+        if self._record is None:
+            return
+        if self._profile is not None:
+            self._profile.disable()
+
+        _record = self._record
+        self._record = None
+        _record["seconds"] = time.perf_counter() - self._height_start
+        if self.trace_memory:
+            _record["memory_peak"] = tracemalloc.get_traced_memory()[1]
+        self.records.append(_record)
+
+        if self._file is not None:
+            self._file.write(json.dumps(_record) + "\n")
+            self._file.flush()
+        if self.progress:
+            self._print_progress(_record)
+
+
+    def discard_height(self):
+        """Drop the record of a height that was not constructed."""
+        if self._profile is not None:
+            self._profile.disable()
+        self._record = None
+
+
+    def close(self):
+        """Stop tracing the memory and write the files."""
+
+        if self._profile is not None:
+            self._profile.dump_stats(self.profile_file_path_and_name)
+            self._profile = None
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.progress and self.records:
+            sys.stdout.write("\n")
+
+
+    def estimated_seconds(self, height):
+        """
+        Estimate the remaining time up to a height from the times of the
+        last heights. The time grows roughly geometrically with the height,
+        so the last time is extrapolated with the mean growth of the last
+        five heights.
+        """
+
+        if not self.records:
+            return None
+
+        _times = [max(record["seconds"], 1e-6) for record in self.records[-6:]]
+        _growth = (_times[-1] / _times[0])**(1 / (len(_times) - 1)) if len(_times) > 1 else 1.0
+        _growth = max(_growth, 1.0)
+
+        _seconds, _time = 0.0, _times[-1]
+        for _ in range(self.records[-1]["height"] + 1, height + 1):
+            _time *= _growth
+            _seconds += _time
+
+        return _seconds
+
+
+    def _print_progress(self, record):
+        """Print a progress line that overwrites the previous one."""
+
+        _line = ("Height " + str(record["height"])
+                 + (" of " + str(self._max_height) if self._max_height > 0 else "")
+                 + ": " + str(record["roots"]) + " roots in " + str(round(record["seconds"], 2)) + " s, "
+                 + str(round(time.perf_counter() - self._start_time, 1)) + " s elapsed")
+        if self._max_height > 0:
+            _line += ", about " + str(round(self.estimated_seconds(self._max_height), 1)) + " s left"
+
+        sys.stdout.write("\r" + _line.ljust(78))
+        sys.stdout.flush()
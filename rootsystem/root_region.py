@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class describes a window of the root system, bounded by the level,
+the depth and the norm of the roots.
+"""
+
+import numpy as np
+
+
+class Root_Region:
+    """
+    A window of the root system of the Feingold-Frenkel algebra, or of
+    another algebra of rank 2 or 3.
+
+    A root vector (level, depth, weight) lies in the window if its level
+    and depth do not exceed the given bounds and its norm is at least
+    the given norm bound. Bounds that are None are not checked. The level
+    and the depth are the first two components of a vector and its last
+    component is the weight, so at rank 2 the depth is the weight.
+
+    The Peterson formula, the co-multiplicities and the Weyl reflections
+    of a root only need vectors that are smaller in every component. So
+    the roots of the window can be constructed from the downward closure
+    of the window, i.e. all vectors that lie below a root of the window.
+
+    An exported table of a window records the window in its first line,
+    see header, such that the construction can be resumed with it.
+
+    Attributes:
+        max_level: The largest level of the window
+        max_depth: The largest depth of the window
+        min_norm: The smallest norm of the window
+    """
+
+
+    def __init__(self, max_level=None, max_depth=None, min_norm=None):
+        """
+        Initialize a new window of the root system.
+
+        Keyword arguments:
+            max_level: The largest level of the window
+            max_depth: The largest depth of the window
+            min_norm: The smallest norm of the window
+        """
+
+        self.max_level = max_level
+        self.max_depth = max_depth
+        self.min_norm = min_norm
+
+
+    def header(self, max_height):
+        """
+        Return the comment of an exported table that records the window and
+        the height up to which its downward closure was constructed.
+        """
+
+        return ("region max_level=" + str(self.max_level) + " max_depth=" + str(self.max_depth)
+                + " min_norm=" + str(self.min_norm) + " max_height=" + str(max_height))
+
+
+    @classmethod
+    def from_header(cls, line):
+        """
+        Return the window and the height of a comment line of an exported
+        table written by header, or None if the line does not record a window.
+        """
+
+        _words = line.lstrip("#").split()
+        if _words[:1] != ["region"]:
+            return None
+
+        try:
+            _values = {key: None if value == "None" else int(value)
+                       for key, value in (word.split("=") for word in _words[1:])}
+            return (cls(_values["max_level"], _values["max_depth"], _values["min_norm"]),
+                    _values["max_height"])
+        except (KeyError, ValueError):
+            raise ValueError("The region line " + line.strip() + " can not be read.")
+
+
+    def weight_bounds(self, algebra, max_height):
+        """
+        Return the downward closure of the possible roots of the window
+        up to a height as a table of weight bounds.
+
+        The entry (level, depth) of the table is the largest weight of a
+        vector in the closure with that level and depth, or -1 if there is
+        none. A vector lies in the closure if and only if its weight does
+        not exceed the entry of its level and depth. In general the table is
+        indexed by all components of a vector apart from the last one.
+
+        Keyword arguments:
+            algebra: The algebra of the roots, used for the norms
+            max_height: The largest height of the roots of the window
+        """
+
+        if algebra.rank < 2:
+            raise ValueError("A window needs an algebra of rank 2 or 3.")
+
+        _bounds = np.full((max_height + 1,) * (algebra.rank - 1), -1, dtype=np.int64)
+        _max_level = max_height if self.max_level is None else min(self.max_level, max_height)
+
+        for level in range(_max_level + 1):
+            # All vectors of this level up to the largest height
+            _size = max_height - level + 1
+            _rest = np.indices((_size,) * (algebra.rank - 1)).reshape(algebra.rank - 1, -1)
+            _keep = np.sum(_rest, axis=0) < _size
+            if self.max_depth is not None:
+                _keep &= _rest[0] <= self.max_depth
+            _rest = _rest[:, _keep]
+
+            _vectors = np.vstack((np.full(_rest.shape[1], level), _rest)).T
+            _norms = np.einsum("ij,jk,ik->i", _vectors, algebra.metric, _vectors)
+
+            # Roots have a norm of at most the norm of a simple root
+            _keep = _norms <= algebra.max_real_norm()
+            if self.min_norm is not None:
+                _keep &= _norms >= self.min_norm
+
+            _indices = (np.full(int(np.sum(_keep)), level),) + tuple(_rest[:-1, _keep])
+            np.maximum.at(_bounds, _indices, _rest[-1, _keep])
+
+        # A vector is in the closure if a root of the window
+        # has larger or equal components
+        for axis in range(_bounds.ndim):
+            _bounds = np.flip(np.maximum.accumulate(np.flip(_bounds, axis), axis=axis), axis)
+
+        return _bounds
+
+
+    @staticmethod
+    def clip_bounds(bounds, height, rank=3):
+        """
+        Restrict a table of weight bounds to the vectors up to a height.
+
+        Returns a table of the shape (height + 1, height + 1), or in general
+        of rank - 1 such dimensions. A table that is None describes all vectors.
+
+        Keyword arguments:
+            bounds: The weight bounds returned by weight_bounds, or None
+            height: The largest height of the vectors
+            rank: The rank of the vectors
+        """
+
+        _shape = (height + 1,) * (rank - 1)
+        _clipped = height - np.sum(np.indices(_shape), axis=0)
+
+        if bounds is not None:
+            _size = min(len(bounds), height + 1)
+            _bounds = np.full(_shape, -1, dtype=np.int64)
+            _bounds[(slice(_size),) * (rank - 1)] = bounds[(slice(_size),) * (rank - 1)]
+            _clipped = np.minimum(_clipped, _bounds)
+
+        return np.maximum(_clipped, -1)
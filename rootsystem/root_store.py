@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class reads and writes the root table as a binary file that can be
+memory-mapped, such that a window of levels and depths is read without
+parsing the rest of the table.
+
+The file starts with a header, followed by these sections, each of which
+starts at a multiple of 8 bytes:
+    index: int64 offsets of the first row of every (level, depth) pair,
+           in row-major order, followed by the number of rows
+    vectors: int32 root vectors, one column per component
+    mults: int64 multiplicities. A negative value -(k + 1) refers to the
+           k-th entry of the big-int side table.
+    big offsets: int64 offsets of the entries of the side table,
+                 followed by its length
+    big table: the multiplicities beyond 64 bits as decimal ASCII digits
+The rows are sorted lexicographically by their root vectors, so the rows
+of a level up to a depth are one contiguous block.
+"""
+
+import os
+import struct
+import numpy as np
+
+# The magic number, the rank, the number of levels and depths,
+# the number of rows, of big multiplicities and of bytes in the side table
+_HEADER = struct.Struct("<8sIIIIQQQ")
+_MAGIC = b"VLROOTS1"
+
+_INT64_MAX = 2**63 - 1
+
+
+def _aligned(size):
+    """Round a number of bytes up to a multiple of 8."""
+    return (size + 7) // 8 * 8
+
+
+class Root_Store:
+    """
+    A read-only memory-mapped root table.
+
+    Attributes:
+        rank: The rank of the root vectors
+        levels: The number of levels, i.e. the largest level plus one
+        depths: The number of depths, i.e. the largest depth plus one
+    """
+
+
+    def __init__(self, file_path_and_name):
+        """
+        Memory-map a file written by Root_Store.write.
+
+        Keyword arguments:
+            file_path_and_name: The file of the root table
+        """
+
+        self._buffer = np.memmap(file_path_and_name, dtype=np.uint8, mode="r")
+
+        (_magic, self.rank, self.levels, self.depths, _,
+         _rows, _big, _big_bytes) = _HEADER.unpack_from(self._buffer)
+        if _magic != _MAGIC:
+            raise ValueError(str(file_path_and_name) + " is not a root table.")
+
+        _offset = _HEADER.size
+        self._index = self._section(_offset, np.int64, self.levels * self.depths + 1)
+        _offset += _aligned(self._index.nbytes)
+        self._vectors = self._section(_offset, np.int32, self.rank * _rows).reshape(self.rank, _rows)
+        _offset += _aligned(self._vectors.nbytes)
+        self._mults = self._section(_offset, np.int64, _rows)
+        _offset += _aligned(self._mults.nbytes)
+        self._big_offsets = self._section(_offset, np.int64, _big + 1)
+        _offset += _aligned(self._big_offsets.nbytes)
+        self._big_table = self._buffer[_offset:_offset + _big_bytes]
+
+
+    def _section(self, offset, dtype, count):
+        """Return a view of count values of the given type at a byte offset."""
+        return self._buffer[offset:offset + count * np.dtype(dtype).itemsize].view(dtype)
+
+
+    @staticmethod
+    def write(file_path_and_name, vectors, mults):
+        """
+        Write a root table to a binary file.
+
+        Keyword arguments:
+            file_path_and_name: The file that is written
+            vectors: The root vectors as an array, one per row
+            mults: The multiplicities of the roots as Python ints
+        """
+
+        _vectors = np.asarray(vectors, dtype=np.int64)
+        _order = np.lexsort(_vectors.T[::-1])
+        _vectors = _vectors[_order]
+        _mults = [mults[i] for i in _order.tolist()]
+        _rows, _rank = _vectors.shape
+
+        _levels = int(_vectors[:, 0].max()) + 1 if _rows > 0 else 0
+        _depths = int(_vectors[:, 1].max()) + 1 if _rows > 0 else 0
+        _cells = _vectors[:, 0] * _depths + _vectors[:, 1]
+        _index = np.searchsorted(_cells, np.arange(_levels * _depths + 1)).astype(np.int64)
+
+        # Move the multiplicities beyond 64 bits to the side table
+        _big = [str(mult).encode("ascii") for mult in _mults if mult > _INT64_MAX]
+        _big_offsets = np.cumsum([0] + [len(digits) for digits in _big], dtype=np.int64)
+        _mult_column = np.zeros(_rows, dtype=np.int64)
+        _count = 0
+        for row, mult in enumerate(_mults):
+            if mult > _INT64_MAX:
+                _count += 1
+                mult = -_count
+            _mult_column[row] = mult
+
+        _sections = [_index.tobytes(),
+                     np.ascontiguousarray(_vectors.T, dtype=np.int32).tobytes(),
+                     _mult_column.tobytes(),
+                     _big_offsets.tobytes(),
+                     b"".join(_big)]
+
+        # Write to a partial file first, such that readers never see half a table
+        _part_path = file_path_and_name + ".part"
+        with open(_part_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _rank, _levels, _depths, 0, _rows, len(_big), int(_big_offsets[-1])))
+            for section in _sections:
+                f.write(section)
+                f.write(bytes(_aligned(len(section)) - len(section)))
+        os.replace(_part_path, file_path_and_name)
+
+
+    def __len__(self):
+        """Return the number of roots in the table."""
+        return self._mults.shape[0]
+
+
+    def window(self, max_level, max_depth, min_level=0):
+        """
+        Return the roots up to a level and a depth.
+
+        Only the rows of the window are read from the file. Returns the root
+        vectors as an int64 array, one per row, and their multiplicities as
+        an int64 array, or as an object array of Python ints if any of them
+        does not fit into 64 bits.
+
+        Keyword arguments:
+            max_level: The largest level of the window
+            max_depth: The largest depth of the window
+            min_level: The smallest level of the window
+        """
+
+        _max_depth = min(max_depth, self.depths - 1)
+        _blocks = []
+        for level in range(min_level, min(max_level, self.levels - 1) + 1):
+            _cell = level * self.depths
+            _blocks.append((self._index[_cell], self._index[_cell + _max_depth + 1]))
+
+        _rows = np.concatenate([np.arange(start, stop) for start, stop in _blocks] + [np.zeros(0, dtype=np.int64)])
+        _vectors = self._vectors[:, _rows].T.astype(np.int64)
+        _mults = self._mults[_rows]
+
+        if np.any(_mults < 0):
+            _mults = np.array([self._big_mult(-mult - 1) if mult < 0 else mult for mult in _mults.tolist()],
+                              dtype=object)
+
+        return _vectors, _mults
+
+
+    def _big_mult(self, entry):
+        """Return a multiplicity from the big-int side table."""
+        _start, _stop = self._big_offsets[entry], self._big_offsets[entry + 1]
+        return int(self._big_table[_start:_stop].tobytes())
@@ -36,9 +36,27 @@ of the Feingold-Frenkel algebra up to a given height.
 Given an infinite dimensional algebra this class stores its root system.
 """
 
+import math
+import os
+import time
 import numpy as np
 from fractions import Fraction
-from .root import Root
+from functools import lru_cache
+from .root import Root, pack_vector, pack_vectors, unpack_key, legacy_hash
+from .root_layer import Root_Layer
+from .root_region import Root_Region
+from .root_writer import Root_Writer
+from .root_store import Root_Store
+from .peterson_pool import Peterson_Pool
+from .modular_peterson import Modular_Peterson
+from .layer_cache import Layer_Cache
+
+@lru_cache(maxsize=None)
+def _divisors(n):
+    """Return the divisors of a positive int in increasing order."""
+    _small = [i for i in range(1, math.isqrt(n) + 1) if n % i == 0]
+    return tuple(_small + [n // i for i in reversed(_small) if i * i != n])
+
 
 class Root_System:
     """
@@ -47,29 +65,113 @@ class Root_System:
     Attributes:
         algebra: The algebra of the root system
         rank: The rank of the algebra
-        root_system: The root system itself
+        root_system: The root system itself. Each height is a dictionary
+                     that maps the packed key of a root vector to the root.
+        engine: The method used to evaluate the Peterson formula
+        storage: The way finished heights are stored
+        co_mult_scale: The common denominator of all co-multiplicities.
+                       The co_mult of every root is stored as an integer,
+                       namely its co-multiplicity times co_mult_scale.
+        region: The Root_Region whose roots are constructed, or None
+                if the root system is constructed completely
+        max_memory: The memory budget of the finished heights of the roots
+                    and the root multiples in bytes, beyond which they are
+                    moved to disk, or None
         """
     
+    # The available methods for evaluating the Peterson formula.
+    # "scan" compares every pair of roots of complementary heights,
+    # "join" looks up the partner of every root in a hash index,
+    # "modular" sums over dense arrays of residues modulo several primes
+    # and rebuilds the multiplicities by Chinese remaindering,
+    # "denominator" uses the Weyl-Kac denominator identity instead.
+    ENGINES = ("scan", "join", "modular", "denominator")
+    
+    # The available ways to store the finished heights.
+    # "objects" keeps a dictionary of Root objects per height,
+    # "compact" keeps the roots of a height in the arrays of a Root_Layer,
+    # "dominant" only keeps one representative of every Weyl orbit, namely
+    # the roots without a positive Dynkin label, and the simple roots.
+    STORAGES = ("objects", "compact", "dominant")
+    
+    # The ways to use the closed forms of the algebra for low levels.
+    # "off" always uses the Peterson formula, "on" uses the closed forms
+    # where they are known and "check" compares them with the Peterson formula.
+    CLOSED_FORMS = ("off", "on", "check")
     
-    def __init__(self, algebra):
+    # The ways to find the roots of the next height.
+    # "strings" adds the root strings that start at the roots of the last height,
+    # "lattice" enumerates the lattice vectors of the height by their norm and
+    # "check" uses the root strings and compares them with the lattice vectors.
+    ENUMERATIONS = ("strings", "lattice", "check")
+    
+    # The largest number of co-multiplicities that are cached in the
+    # dominant storage mode before the cache is cleared.
+    _CO_MULT_CACHE_SIZE = 1 << 18
+    
+    
+    def __init__(self, algebra, engine="join", storage="objects", closed_forms="on", enumeration="lattice",
+                 max_memory=None, spill_directory=None):
         """
         Initialize a new root system from a given infinite dimensional algebra.
         
         The root system is automatically constructed up to height 1.
+        
+        Keyword arguments:
+            algebra: The algebra of the root system
+            engine: The method used to evaluate the Peterson formula,
+                    one of Root_System.ENGINES
+            storage: The way finished heights are stored,
+                     one of Root_System.STORAGES
+            closed_forms: The use of the closed forms of the algebra,
+                          one of Root_System.CLOSED_FORMS
+            enumeration: The way the roots of the next height are found,
+                         one of Root_System.ENUMERATIONS
+            max_memory: An optional memory budget of the finished heights of
+                        the roots and the root multiples in bytes. The least
+                        recently used heights beyond it are moved to disk,
+                        see Layer_Cache. Only the compact storage mode can be
+                        moved to disk. The height under construction, the
+                        multiple index and the co-multiplicity cache stay in
+                        memory outside the budget.
+            spill_directory: The directory of the heights on disk, by
+                             default a temporary directory
         """
         
+        if engine not in self.ENGINES:
+            raise ValueError("Unknown Peterson engine: " + str(engine))
+        if storage not in self.STORAGES:
+            raise ValueError("Unknown storage mode: " + str(storage))
+        if closed_forms not in self.CLOSED_FORMS:
+            raise ValueError("Unknown closed form mode: " + str(closed_forms))
+        if enumeration not in self.ENUMERATIONS:
+            raise ValueError("Unknown enumeration mode: " + str(enumeration))
+        if max_memory is not None and storage != "compact":
+            raise ValueError("A memory budget needs the compact storage mode, not " + str(storage))
+        if algebra.type == "indefinite" and enumeration != "strings" and storage != "dominant":
+            raise ValueError("The lattice enumeration needs a finite, affine or hyperbolic algebra, use the strings enumeration.")
+        
         self.algebra = algebra
         self.rank = algebra.rank
+        self.engine = engine
+        self.storage = storage
+        self.closed_forms = closed_forms
+        self.enumeration = enumeration
+        self.max_memory = max_memory
         self.root_system = []
         
+        # The co-multiplicities of the roots up to a height h have
+        # denominators that divide lcm(1, ..., h). We start at height 1.
+        self.co_mult_scale = 1
+        
         # Add the CSA to the root table
-        _csa = set()
+        _csa = {}
         _csa_vector = np.zeros(self.rank, dtype=int)
         _csa_root = Root(_csa_vector)
         _csa_root.mult = self.rank
-        _csa_root.co_mult = Fraction(0)
+        _csa_root.co_mult = 0
         _csa_root.norm = 0
-        _csa.add(_csa_root)
+        _csa[_csa_root.key] = _csa_root
         self.root_system.append(_csa)
         
         # Stop the construction if the algebra has rank 0
@@ -77,7 +179,7 @@ class Root_System:
             return
             
         # Add the simple roots
-        _simple_roots = set()
+        _simple_roots = {}
         
         for i in range(self.rank):
             # Skip the index if the diagonal element in the 
@@ -91,9 +193,9 @@ class Root_System:
                 
             _simple_root = Root(_root_vector)
             _simple_root.mult = 1
-            _simple_root.co_mult = Fraction(1)
-            _simple_root.norm = self.algebra.d[i] * self.algebra.cartan_matrix[i][i]
-            _simple_roots.add(_simple_root)
+            _simple_root.co_mult = self.co_mult_scale
+            _simple_root.norm = self.algebra.d[i][i] * self.algebra.cartan_matrix[i][i]
+            _simple_roots[_simple_root.key] = _simple_root
            
         
         self.root_system.append(_simple_roots)
@@ -102,190 +204,1322 @@ class Root_System:
         self._constructed_height = 1
         self._fully_constructed = False
         
-        # Define the lists of the root multiples
+        # Define the lists of the root multiples. Like the roots they
+        # are stored as dictionaries keyed by the packed root vector.
         self._root_multiples = []
-        self._root_multiples.append([])
-        self._root_multiples.append([])
+        self._root_multiples.append({})
+        self._root_multiples.append({})
+        
+        # The multiplicities of the roots sorted by their directions. Every
+        # root is a multiple k * p of a primitive vector p, i.e. the gcd of the
+        # components of p is 1. _multiple_index maps the packed key of p to a
+        # dictionary that maps k to the multiplicity of k * p, and
+        # _primitive_keys holds the keys of the primitive vectors per height.
+        self._multiple_index = {}
+        self._primitive_keys = [[], []]
+        
+        # With a memory budget only the primitive vectors up to half of the
+        # height of the construction are indexed, the multiples of all other
+        # primitive vectors are beyond it. None means that all are indexed.
+        self._index_limit = None
+        
+        # The packed keys of the simple roots. Adding a multiple of such a
+        # key to the key of a root adds the same multiple of the simple root.
+        self._simple_keys = [pack_vector([1 if i == j else 0 for j in range(self.rank)])
+                             for i in range(self.rank)]
+        
+        # The Cartan matrix and its columns as Python ints and the indices of
+        # the real simple roots, used to reflect vectors to their orbit
+        # representatives. The Dynkin label i of a vector is its product with column i.
+        self._cartan_rows = self.algebra.cartan_matrix.tolist()
+        self._cartan_columns = self.algebra.cartan_matrix.T.tolist()
+        self._real_indices = [i for i in range(self.rank) if self._cartan_rows[i][i] > 0]
+        
+        # Co-multiplicities of arbitrary vectors in the dominant storage mode
+        self._co_mult_cache = {}
+        
+        # The multiplicities of orbit representatives above the constructed
+        # heights, which were computed on demand by multiplicity, and the
+        # co-multiplicities of the vectors below the vector that is resolved
+        self._demand_mults = {}
+        self._demand_co_mults = None
+        
+        # The residues of the modular Peterson engine, created when first used
+        self._modular = None
+        
+        # The Root_Profiler of the running construction, or None
+        self._profiler = None
+        
+        # The region of the construction and the weight bounds of its
+        # downward closure, see Root_Region.weight_bounds
+        self.region = None
+        self._region_bounds = None
+        self._region_height = 0
+        
+        self._index_height(1)
+        self._finish_height(0)
+        self._finish_height(1)
+        
+        # Keep the finished heights of the roots and of the root multiples
+        # within one memory budget
+        if max_memory is not None:
+            self.root_system = Layer_Cache(max_memory, spill_directory, self.root_system)
+            self._root_multiples = Layer_Cache(max_memory, layers=self._root_multiples, name="multiples",
+                                               share_with=self.root_system)
         
         # If the algebra is finite, we can construct the root system to all heights.
         if self.algebra.finite:
-            construct(0)  
+            self.construct(0)
 
+    @classmethod
+    def from_txt_file(cls, algebra, file_path_and_name, engine="join", storage="objects", closed_forms="on",
+                      enumeration="lattice", max_memory=None, spill_directory=None):
+        """
+        Create a root system from a text file written by write_txt_file.
+        
+        The file has to contain all roots up to its largest height. If it
+        was written by a construction of a region, the region is restored
+        from its first line, see Root_Region.header, and the file has to
+        contain the roots of its downward closure. A ValueError is raised
+        if a height of the file does not hold these roots. The co-multiplicities,
+        norms and root multiples are recomputed and the construction can be
+        continued from the largest height in the file.
+        
+        Keyword arguments:
+            algebra: The algebra of the root system
+            file_path_and_name: The file with one root vector and its multiplicity per row
+            engine: The method used to evaluate the Peterson formula
+            storage: The way finished heights are stored
+            closed_forms: The use of the closed forms of the algebra
+            enumeration: The way the roots of the next height are found
+            max_memory: An optional memory budget of the finished heights in bytes
+            spill_directory: The directory of the heights on disk
+        """
+        
+        _root_system = cls(algebra, engine=engine, storage=storage, closed_forms=closed_forms,
+                           enumeration=enumeration, max_memory=max_memory, spill_directory=spill_directory)
+        
+        # Read the rows as Python ints, such that huge multiplicities stay exact
+        with open(file_path_and_name) as f:
+            _lines = [line for line in f if line.strip()]
+        _rows = [[int(x) for x in line.split(",")] for line in _lines if not line.startswith("#")]
+        
+        # Restore the region of a windowed construction
+        for line in _lines:
+            if line.startswith("#") and Root_Region.from_header(line) is not None:
+                _root_system._set_region(*Root_Region.from_header(line))
+            
+        if len(_rows) == 0:
+            return _root_system
+        
+        _vectors = np.array([row[:-1] for row in _rows], dtype=np.int64)
+        _heights = np.sum(_vectors, axis=1).tolist()
+        _norms = np.einsum("ij,jk,ik->i", _vectors, algebra.metric, _vectors).tolist()
+        _max_height = max(_heights)
+        
+        # Sort the roots into their heights
+        _layers = [{} for _ in range(_max_height + 1)]
+        for vector, row, height, norm in zip(_vectors, _rows, _heights, _norms):
+            _root = Root(vector)
+            _root.mult = row[-1]
+            _root.norm = norm
+            _layers[height][_root.key] = _root
+            
+        if set(_layers[1]) != set(_root_system.root_system[1]):
+            raise ValueError("The simple roots in " + str(file_path_and_name) + " do not match the algebra.")
+        _root_system._check_loaded_heights(_layers, file_path_and_name)
+        
+        # Recompute the co-multiplicities and root multiples height by height
+        for height in range(2, _max_height + 1):
+            _root_system.root_system.append(_layers[height])
+            _root_system._extend_co_mult_scale(height)
+            
+            for root in _layers[height].values():
+                root.co_mult = _root_system._calculate_co_mult(root) + _root_system.co_mult_scale * root.mult
+                
+            _root_system._index_height(height)
+            _root_system._root_multiples.append(_root_system._construct_root_multiples(height))
+            _root_system._finish_height(height)
+            _root_system._constructed_height = height
+            
+        # Restore the parts of the root strings that reach above the largest height.
+        # The dominant storage mode and the lattice enumeration find the next
+        # roots without root strings.
+        _strings = storage != "dominant" and enumeration != "lattice"
+        for height in range(1, _max_height + 1 if _strings else 1):
+            for root in _root_system.root_system[height].values():
+                _root_system._add_root_strings(root, height, _max_height)
+        
+        return _root_system
+    
+    
+    def _check_loaded_heights(self, layers, file_path_and_name):
+        """
+        Raise a ValueError naming the first height of a loaded table that does
+        not hold exactly the roots in the region of the construction, since the
+        Peterson formula would compute wrong multiplicities from it.
+        
+        The roots of a height are enumerated from the lattice, or from the root
+        strings of the lower heights if the strings enumeration is chosen or
+        the lattice enumeration does not work for the algebra.
+        
+        Keyword arguments:
+            layers: The roots of every height as dicts
+            file_path_and_name: The file of the table
+        """
+        
+        _strings = self.enumeration == "strings" or self.algebra.type == "indefinite"
+        _string_keys = [set() for _ in layers]
+        
+        for height in range(1, len(layers)):
+            if height > 1:
+                if _strings:
+                    _keys = {key for key in _string_keys[height] if self._in_region(unpack_key(key, self.rank))}
+                else:
+                    _keys = set(pack_vectors(self._lattice_roots(height)[0]).tolist())
+                if set(layers[height]) != _keys:
+                    raise ValueError("The roots of height " + str(height) + " in " + str(file_path_and_name)
+                                     + " are incomplete or do not match the algebra.")
+            
+            if _strings:
+                for root in layers[height].values():
+                    _dynkin_labels = self.algebra.root_to_weight(root.vector)
+                    for i in self._real_indices:
+                        for j in range(1, min(-_dynkin_labels[i], len(layers) - 1 - height) + 1):
+                            _string_keys[height + j].add(root.key + j * self._simple_keys[i])
+    
+    
+    def _finish_height(self, height):
+        """
+        Store the roots and root multiples of a height whose multiplicities
+        are final in the chosen storage mode.
+        """
+        
+        if self.storage == "compact":
+            self.root_system[height] = Root_Layer.from_roots(self.algebra, self.root_system[height].values())
+            if height < len(self._root_multiples):
+                self._root_multiples[height] = Root_Layer.from_roots(self.algebra, self._root_multiples[height].values())
+        elif self.storage == "dominant" and height > 1:
+            # Only keep the orbit representatives, all other
+            # roots and the root multiples are found by reflection
+            self.root_system[height] = {key: root for key, root in self.root_system[height].items()
+                                        if np.all(self.algebra.root_to_weight(root.vector)[self._real_indices] <= 0)}
+            if height < len(self._root_multiples):
+                self._root_multiples[height] = {}
+    
+    
+    def _extend_co_mult_scale(self, height):
+        """
+        Make sure that the common denominator of the co-multiplicities
+        is divisible by height and rescale all stored co-multiplicities if not.
+        """
+        
+        if self.co_mult_scale % height == 0:
+            return
+        
+        self._set_co_mult_scale(self.co_mult_scale * height // math.gcd(self.co_mult_scale, height))
+    
+    
+    def _set_co_mult_scale(self, co_mult_scale):
+        """
+        Change the common denominator of the co-multiplicities to a multiple
+        of the current one and rescale all stored co-multiplicities.
+        """
+        
+        _factor = co_mult_scale // self.co_mult_scale
+        if _factor == 1:
+            return
+        self.co_mult_scale = co_mult_scale
+        self._co_mult_cache.clear()
+        
+        for layers in (self.root_system, self._root_multiples):
+            if isinstance(layers, Layer_Cache):
+                # The heights on disk are rescaled when they are read
+                layers.rescale(_factor)
+                continue
+            for layer in layers:
+                if isinstance(layer, Root_Layer):
+                    layer.co_mults *= _factor
+                    continue
+                for root in layer.values():
+                    if root.co_mult is not None:
+                        root.co_mult *= _factor
+    
+    
+    def _install_height(self, height, roots, multiples, co_mult_scale):
+        """
+        Install the finished roots and root multiples of a height that were
+        constructed by another root system of the same algebra.
+        
+        Keyword arguments:
+            height: The height of the roots
+            roots: The roots of that height as stored in the other root system
+            multiples: The root multiples of that height
+            co_mult_scale: The common denominator of the co-multiplicities
+                           of the other root system
+        """
+        
+        self._set_co_mult_scale(co_mult_scale)
+        
+        while len(self.root_system) <= height:
+            self.root_system.append({})
+        while len(self._root_multiples) <= height:
+            self._root_multiples.append({})
+            
+        self.root_system[height] = roots
+        self._root_multiples[height] = multiples
+        self._constructed_height = max(self._constructed_height, height)
+    
+    
+    def co_multiplicity(self, root):
+        """Return the co-multiplicity of a root as a fraction."""
+        return Fraction(root.co_mult, self.co_mult_scale)
+    
+    
     def constructed_height(self):
         """Return the height to which we so far have constructed the root system."""
         return self._constructed_height
     
+    
+    def orbit_representative(self, vector):
+        """
+        Reflect a positive vector down to the representative of its Weyl orbit.
+        
+        The representative is either a simple root or a vector without a positive
+        Dynkin label. Every simple Weyl reflection in an index with a positive
+        Dynkin label lowers the height, and it never leaves the positive roots.
+        Returns the representative as a list, or None if the vector can not be a root.
+        """
+        
+        _vector = [int(x) for x in vector]
+        _height = sum(_vector)
+        
+        while _height > 1:
+            for i in self._real_indices:
+                _label = sum(a * x for a, x in zip(self._cartan_columns[i], _vector))
+                if _label > 0:
+                    _vector[i] -= _label
+                    _height -= _label
+                    if _vector[i] < 0:
+                        return None
+                    break
+            else:
+                return _vector
+            
+        return _vector if _height == 1 else None
+    
         
     def _get_root_mult_vector(self, vector):
         """Get the root multiplicity by its root vector."""
-        _vector = np.absolute(vector)
-        return self._get_root_mult(Root(_vector))
+        _vector = np.absolute(vector).tolist()
+        return self._get_root_mult_key(pack_vector(_vector), sum(_vector))
 
 
     def _get_root_mult(self, root_to_get):
         """Get the root multiplicity."""
-        _root_height = root_to_get.height()
-        _roots = set()
+        return self._get_root_mult_key(root_to_get.key, root_to_get.height())
+    
+    
+    def _get_root_mult_key(self, key, height):
+        """
+        Get the root multiplicity by the packed key of its root vector
+        and its height.
+        """
         
-        if _root_height < 0:
+        if height < 0 or key is None:
             return 0
         
+        # In the dominant storage mode look up the orbit representative instead.
+        # Real roots are recognized by their norm without going down their orbit.
+        if self.storage == "dominant" and height > 1:
+            _vector = unpack_key(key, self.rank).tolist()
+            if self.algebra.is_real_root(_vector):
+                return 1
+            _representative = self.orbit_representative(_vector)
+            if _representative is None:
+                return 0
+            key = pack_vector(_representative)
+            height = sum(_representative)
+        
         # If we haven't constructed the roots system this far, do so now
-        if _root_height > self._constructed_height and not self._fully_constructed:
-            self.construct(_root_height)
+        if height > self._constructed_height and not self._fully_constructed:
+            self.construct(height)
             
         # Try to fetch the root
-        if len(self.root_system) > _root_height:
-            _roots = self.root_system[_root_height]
-            if root_to_get in _roots:
-                for root in _roots:
-                    if root_to_get == root:
-                        return root.mult
+        if len(self.root_system) > height:
+            _root = self.root_system[height].get(key)
+            if _root is not None:
+                return _root.mult
                     
         #The root is not in the root system, so return null 
         return 0
+    
+    
+    def multiplicity(self, vector):
+        """
+        Return the multiplicity of a root vector, or 0 if it is not a root.
+        
+        Vectors within the constructed heights are looked up in the root table.
+        Above them the multiplicity is computed on demand without constructing
+        the heights in between: only the orbit representatives of the vectors
+        below the vector are resolved, from the lowest height up. They are
+        kept for later queries.
+        """
+        
+        _vector = [int(x) for x in vector]
+        
+        # Negative roots have the multiplicities of the positive roots
+        if all(x <= 0 for x in _vector):
+            _vector = [-x for x in _vector]
+        if min(_vector) < 0:
+            return 0
+        if sum(_vector) == 0:
+            return self.rank
+        
+        return self._demand_mult(_vector)
+    
+    
+    def _in_table(self, vector):
+        """Check if the multiplicity of a positive vector can be looked up in the root table."""
+        _height = sum(vector)
+        return _height <= 1 or (_height <= self._constructed_height and self._in_region(vector))
+    
+    
+    def _demand_mult(self, vector):
+        """
+        Return the multiplicity of a positive vector, given as a list, from the
+        root table or from the multiplicities computed on demand.
+        """
+        
+        if self.algebra.is_real_root(vector):
+            return 1
+        
+        _representative = self.orbit_representative(vector)
+        if _representative is None:
+            return 0
+        
+        _key = pack_vector(_representative)
+        if self._in_table(_representative):
+            return self._get_root_mult_key(_key, sum(_representative))
+        
+        if _key not in self._demand_mults:
+            self._resolve_below(_representative)
+            
+        return self._demand_mults[_key]
+    
+    
+    def _resolve_below(self, vector):
+        """
+        Compute the multiplicities of the orbit representatives of all vectors
+        below a vector without a positive Dynkin label, that are neither in the
+        root table nor computed before.
+        
+        The co-multiplicities of all vectors below the vector are kept in a
+        dense array, which is filled from the lowest height up. The Peterson
+        formula of a representative only needs the heights below it.
+        """
+        
+        _shape = tuple(x + 1 for x in vector)
+        _betas = np.indices(_shape).reshape(self.rank, -1).T
+        _heights = np.sum(_betas, axis=1)
+        _representatives, _valid = self._orbit_representatives(_betas)
+        
+        for height in range(2, sum(vector) + 1):
+            self._extend_co_mult_scale(height)
+        
+        _mults = np.zeros(_shape, dtype=object)
+        self._demand_co_mults = np.zeros(_shape, dtype=object)
+        _order = np.argsort(_heights, kind="stable")
+        _bounds = np.searchsorted(_heights[_order], np.arange(sum(vector) + 2))
+        
+        try:
+            for height in range(1, sum(vector) + 1):
+                _all_rows = _order[_bounds[height]:_bounds[height + 1]]
+                _rows = _all_rows[_valid[_all_rows]]
+                
+                # Compute the representatives of this height that are still unknown.
+                # Their Peterson formulas only use the co-multiplicities below them.
+                # The lower representatives are all known by now.
+                for representative in _representatives[_rows].tolist():
+                    _key = pack_vector(representative)
+                    if sum(representative) == height and _key not in self._demand_mults and not self._in_table(representative):
+                        self._demand_mults[_key] = self._demand_root_mult(representative)
+                
+                # Now the multiplicities and co-multiplicities of the whole height are known
+                for row, representative in zip(_rows.tolist(), _representatives[_rows].tolist()):
+                    _mults[tuple(_betas[row])] = self._demand_mult(representative)
+                
+                # Multiples of real roots are no roots, but have a co-multiplicity
+                for row in _all_rows.tolist():
+                    _beta = _betas[row].tolist()
+                    _gcd = math.gcd(*_beta)
+                    _co_mult = 0
+                    for i in _divisors(_gcd):
+                        _co_mult += _mults[tuple(x // i for x in _beta)] * (self.co_mult_scale // i)
+                    self._demand_co_mults[tuple(_beta)] = _co_mult
+        finally:
+            self._demand_co_mults = None
+    
+    
+    def _demand_root_mult(self, representative):
+        """Compute the multiplicity of an orbit representative in _resolve_below."""
+        
+        if not self._has_connected_support(representative):
+            return 0
+        
+        _root = Root(np.array(representative))
+        _root.norm = self.algebra.inner_product(_root, _root)
+        
+        # The co-multiplicity without the own multiplicity
+        _gcd = math.gcd(*representative)
+        _root.co_mult = 0
+        for i in _divisors(_gcd)[1:]:
+            _root.co_mult += self._demand_mult([x // i for x in representative]) * (self.co_mult_scale // i)
+        
+        return self._calculate_mults(sum(representative), [_root], demand=True)[0]
+    
+    
+    def _orbit_representatives(self, vectors):
+        """
+        Reflect an array of positive vectors down to the representatives of
+        their Weyl orbits at once, like orbit_representative.
+        
+        Returns the array of the representatives and a boolean array that is
+        False for every vector that can not be a root.
+        """
+        
+        _vectors = np.array(vectors, dtype=np.int64)
+        _heights = np.sum(_vectors, axis=1)
+        _valid = _heights > 0
+        _cartan = self.algebra.cartan_matrix[:, self._real_indices]
+        
+        while True:
+            _labels = np.dot(_vectors, _cartan)
+            _positive = _labels > 0
+            _active = _valid & (_heights > 1) & np.any(_positive, axis=1)
+            if not np.any(_active):
+                break
+            
+            # Reflect in the first positive Dynkin label
+            _rows = np.nonzero(_active)[0]
+            _columns = np.argmax(_positive[_rows], axis=1)
+            _steps = _labels[_rows, _columns]
+            _indices = np.array(self._real_indices)[_columns]
+            _vectors[_rows, _indices] -= _steps
+            _heights[_rows] -= _steps
+            _valid[_rows] &= _vectors[_rows, _indices] >= 0
+            
+        return _vectors, _valid & (_heights > 0)
+    
+    
+    def _peterson_box_sum(self, root):
+        """
+        Calculate the r.h.s of the Peterson formula from the dense
+        co-multiplicities of _resolve_below.
+        """
+        
+        _vector = root.vector.tolist()
+        _co_mults = self._demand_co_mults[tuple(slice(x + 1) for x in _vector)]
+        
+        # The vectors below the root with a co-multiplicity, apart from the root
+        _betas = np.transpose(np.nonzero(_co_mults))
+        _betas = _betas[np.sum(_betas, axis=1) < sum(_vector)]
+        _gammas = np.array(_vector) - _betas
+        
+        # The sum is symmetric in beta and gamma, so only take the pairs
+        # with beta before gamma twice and the pair with beta = gamma once
+        _beta_rows = np.ravel_multi_index(tuple(_betas.T), _co_mults.shape)
+        _gamma_rows = np.ravel_multi_index(tuple(_gammas.T), _co_mults.shape)
+        _keep = _beta_rows <= _gamma_rows
+        _betas, _gammas = _betas[_keep], _gammas[_keep]
+        _weights = np.where(_beta_rows[_keep] < _gamma_rows[_keep], 2, 1)
+        
+        _gamma_co_mults = _co_mults[tuple(_gammas.T)]
+        _keep = _gamma_co_mults != 0
+        _betas, _gammas = _betas[_keep], _gammas[_keep]
+        
+        _inner_products = np.einsum("ij,jk,ik->i", _betas, self.algebra.metric, _gammas) * _weights[_keep]
+        _products = _co_mults[tuple(_betas.T)] * _gamma_co_mults[_keep] * _inner_products.astype(object)
+        
+        return int(np.sum(_products)) if len(_products) > 0 else 0
+    
+    
+    def hash_statistics(self):
+        """
+        Report how well the packed keys and the legacy Root hash spread
+        the roots of every constructed height over the buckets of a hash table.
+        
+        Returns a list with one dictionary per height. For each hash function
+        it contains the number of full hash collisions, the number of roots
+        whose first bucket is already occupied, the largest number of roots
+        sharing a first bucket and the mean and maximal number of probes when
+        inserting the roots with the open addressing of a Python dictionary.
+        The table size is chosen like the one of a Python dictionary.
+        """
+        
+        _statistics = []
+        
+        for height in range(1, self._constructed_height + 1):
+            _keys = list(self.root_system[height]) + list(self._root_multiples[height])
+            _table_size = 8
+            while 3 * len(_keys) > 2 * _table_size:
+                _table_size *= 2
+                
+            _entry = {"height": height, "roots": len(_keys), "buckets": _table_size}
+            _hashes = {"packed": [hash(key) for key in _keys],
+                       "legacy": [legacy_hash(unpack_key(key, self.rank)) for key in _keys]}
+            
+            for name, hashes in _hashes.items():
+                _buckets = {}
+                _occupied = set()
+                _probes = []
+                for hash_val in hashes:
+                    _bucket = hash_val & (_table_size - 1)
+                    _buckets[_bucket] = _buckets.get(_bucket, 0) + 1
+                    
+                    # Follow the probe sequence of CPython's dictionaries
+                    _perturb = hash_val & 0xFFFFFFFFFFFFFFFF
+                    _probe_count = 1
+                    while _bucket in _occupied:
+                        _perturb >>= 5
+                        _bucket = (5 * _bucket + _perturb + 1) & (_table_size - 1)
+                        _probe_count += 1
+                    _occupied.add(_bucket)
+                    _probes.append(_probe_count)
+                    
+                _entry[name + "_collisions"] = len(hashes) - len(set(hashes))
+                _entry[name + "_bucket_collisions"] = len(hashes) - len(_buckets)
+                _entry[name + "_max_bucket"] = max(_buckets.values(), default=0)
+                _entry[name + "_mean_probes"] = sum(_probes) / max(len(_probes), 1)
+                _entry[name + "_max_probes"] = max(_probes, default=0)
+                
+            _statistics.append(_entry)
+            
+        return _statistics
      
      
     def write_txt_file(self, file_path_and_name):
-        """Write the root system constructed thus far to a text file."""    
-        _output = np.zeros(4, dtype=int)
-    
-        # Iterate through the root system and append the sorted roots
-        # to the output
-        for subset in self.root_system[:self._constructed_height+1]:
-            _new_block = np.zeros(4, dtype=int)
-            for root in subset:
-                _new_row = np.append(root.vector, root.mult)
-                _new_block = np.vstack((_new_block, _new_row))
-            _new_block = np.array(sorted(_new_block[1:].tolist()))
-            _output = np.vstack((_output, _new_block))
-
+        """Write the root system constructed thus far to a text file."""
         try:
-            np.savetxt(file_path_and_name, _output[2:], fmt='%d', delimiter=',')
+            with Root_Writer(file_path_and_name) as writer:
+                self._write_heights(writer)
         except IOError:
             print("The file could not be written!")
+    
+    
+    def write_store(self, file_path_and_name):
+        """Write the root system constructed thus far to a binary Root_Store file."""
+        _vectors, _mults = [np.zeros((0, self.rank), dtype=np.int64)], []
+        for height in range(1, self._constructed_height + 1):
+            _height_vectors, _height_mults = self._height_rows(height)
+            _vectors.append(_height_vectors)
+            _mults += _height_mults
+            
+        try:
+            Root_Store.write(file_path_and_name, np.concatenate(_vectors), _mults)
+        except IOError:
+            print("The file could not be written!")
+    
+    
+    def _write_heights(self, writer):
+        """
+        Pass all constructed heights that a Root_Writer has not written yet to
+        it. A new file starts with the region of the construction, if any.
+        """
+        
+        if writer.height < 1 and self.region is not None:
+            writer.write_comment(self.region.header(self._region_height))
+        for height in range(max(writer.height + 1, 1), self._constructed_height + 1):
+            writer.write_height(height, *self._height_rows(height))
+    
+    
+    def _height_rows(self, height):
+        """
+        Return the root vectors of a height as an array, sorted
+        lexicographically, and the list of their multiplicities.
+        """
+        
+        _subset = self.root_system[height]
+        if self.storage == "dominant" and height > 1:
+            _subset = self._expand_height(height)
+            
+        if isinstance(_subset, Root_Layer):
+            # The rows of a layer are already sorted
+            return _subset.vectors, _subset.mults.tolist()
+        
+        _roots = list(_subset.values())
+        _vectors = np.array([root.vector.tolist() for root in _roots], dtype=np.int64).reshape(len(_roots), self.rank)
+        _order = np.lexsort(_vectors.T[::-1])
+        
+        return _vectors[_order], [int(_roots[i].mult) for i in _order.tolist()]
 
 
-    def construct(self, max_height):
-        """Construct the root system up to the given height."""
+    def construct(self, max_height, workers=1, region=None, writer=None, profiler=None):
+        """
+        Construct the root system up to the given height.
+        
+        If a region is given, only the roots of its downward closure are
+        constructed, i.e. the roots of the region and the roots below them,
+        which the Peterson formula needs. The region is kept for all later
+        constructions, which extend its downward closure to their height.
+        A ValueError is raised if the closure needs roots below the heights
+        that are already constructed.
+        
+        Keyword arguments:
+            max_height: The height up to which the root system is constructed
+            workers: The number of processes that evaluate the Peterson
+                     formula for the roots of a new height in parallel,
+                     at most the number of CPUs
+            region: An optional Root_Region that bounds the construction
+            writer: An optional Root_Writer, to which every height is
+                    written as soon as it is finished
+            profiler: An optional Root_Profiler, which records the metrics
+                      of every height
+        """
+        
+        for _ in self._construct_heights(max_height, workers, region, writer, profiler):
+            pass
+    
+    
+    def construct_iter(self, max_height, workers=1, region=None, writer=None, profiler=None):
+        """
+        Construct the root system up to the given height like construct, but
+        yield every new height as soon as its multiplicities are final.
+        
+        Yields the height, a Root_Layer of its roots and a Root_Layer of its
+        root multiples. The co_mults of both layers are the co-multiplicities
+        as Fractions. In the dominant storage mode all roots of the height
+        are yielded and the root multiples are left empty.
+        
+        Keyword arguments:
+            max_height: The height up to which the root system is constructed
+            workers: The number of processes that evaluate the Peterson
+                     formula for the roots of a new height in parallel,
+                     at most the number of CPUs
+            region: An optional Root_Region that bounds the construction
+            writer: An optional Root_Writer, to which every height is
+                    written as soon as it is finished
+            profiler: An optional Root_Profiler, which records the metrics
+                      of every height
+        """
+        
+        for height in self._construct_heights(max_height, workers, region, writer, profiler):
+            yield height, self._export_roots(height), self._export_layer(self._root_multiples[height].values())
+    
+    
+    def _construct_heights(self, max_height, workers, region, writer, profiler=None):
+        """
+        Construct the root system up to the given height and
+        yield every height as soon as it is finished.
+        """
         
         # If the root system is already fully constructed, just do nothing and return.
         if self._fully_constructed or (not self.algebra.finite and max_height == 0) or self.rank == 0:
             return
         
+        # Keep the region of an earlier construction or of a resumed table
+        if region is None:
+            region = self.region
+        if region is not None:
+            self._set_region(region, max_height)
+        if self.max_memory is not None:
+            self._limit_index(max_height)
+        
+        
+        # The Peterson evaluations of one height only read the lower heights,
+        # so they can be spread over a pool of worker processes. More workers
+        # than CPUs only add the overhead of the pool.
+        workers = min(workers, os.cpu_count() or 1)
+        _pool = Peterson_Pool(self, workers) if workers > 1 and self.engine != "modular" else None
+        
+        self._profiler = profiler
+        if profiler is not None:
+            profiler.start(max_height)
+        
+        try:
+            if writer is not None:
+                self._write_heights(writer)
+            while(self._constructed_height < max_height or max_height == 0):
+                if profiler is not None:
+                    profiler.start_height(self._constructed_height + 1)
+                if not self._construct_next_height(_pool):
+                    if profiler is not None:
+                        profiler.discard_height()
+                    return
+                if profiler is not None:
+                    profiler.finish_height()
+                if writer is not None:
+                    self._write_heights(writer)
+                yield self._constructed_height
+        finally:
+            if _pool is not None:
+                _pool.close()
+            if profiler is not None:
+                profiler.close()
+            self._profiler = None
+    
+    
+    def _count(self, metric, amount):
+        """Add an amount to a metric of the profiler of the running construction, if there is one."""
+        if self._profiler is not None:
+            self._profiler.add(metric, amount)
+    
+    
+    def _export_roots(self, height):
+        """Return all roots of a finished height as a Root_Layer with exact co-multiplicities."""
+        
+        if self.storage != "dominant" or height <= 1:
+            return self._export_layer(self.root_system[height].values())
+        
+        # The expanded roots have no co-multiplicities yet
+        _layer = self._expand_height(height)
+        _layer.co_mults = np.array([Fraction(self._lattice_co_mult(vector), self.co_mult_scale)
+                                    for vector in _layer.vectors.tolist()], dtype=object)
+        
+        return _layer
+    
+    
+    def _export_layer(self, roots):
+        """
+        Return a copy of roots as a Root_Layer whose co_mults are the
+        co-multiplicities as Fractions, such that later changes of
+        co_mult_scale do not affect it.
+        """
+        
+        _layer = Root_Layer.from_roots(self.algebra, roots)
+        _layer.co_mults = np.array([Fraction(co_mult, self.co_mult_scale) for co_mult in _layer.co_mults.tolist()],
+                                   dtype=object)
+        
+        return _layer
+    
+    
+    def _set_region(self, region, max_height):
+        """
+        Restrict the construction to the downward closure of a region up to a height.
+        
+        The heights that are already constructed have to contain all roots
+        of the new closure, otherwise a ValueError is raised.
+        """
+        
+        _bounds = region.weight_bounds(self.algebra, max_height)
+        
+        _old_bounds = Root_Region.clip_bounds(self._region_bounds, self._constructed_height, self.rank)
+        _new_bounds = Root_Region.clip_bounds(_bounds, self._constructed_height, self.rank)
+        if np.any(_new_bounds > _old_bounds):
+            raise ValueError("The region needs roots below height " + str(self._constructed_height)
+                             + " that were not constructed.")
+        
+        self.region = region
+        self._region_bounds = _bounds
+        self._region_height = max_height
+    
+    
+    def _region_mask(self, vectors):
+        """Return which of an array of vectors lie in the downward closure of the region."""
+        if self._region_bounds is None:
+            return np.ones(len(vectors), dtype=bool)
+        
+        _size = len(self._region_bounds)
+        _mask = np.all(vectors[:, :-1] < _size, axis=1)
+        _mask[_mask] = vectors[_mask, -1] <= self._region_bounds[tuple(vectors[_mask, :-1].T)]
+        
+        return _mask
+    
+    
+    def _in_region(self, vector):
+        """Check if a vector lies in the downward closure of the region of the construction."""
+        if self._region_bounds is None:
+            return True
+        
+        _size = len(self._region_bounds)
+        return all(x < _size for x in vector[:-1]) and vector[-1] <= self._region_bounds[tuple(vector[:-1])]
+    
+    
+    def _construct_next_height(self, pool=None):
+        """
+        Construct the roots of the next height and calculate their multiplicities.
+        Returns False if there are no more roots, i.e. the root system is fully constructed.
+        
+        Keyword arguments:
+            pool: An optional Peterson_Pool that evaluates the Peterson formula
+        """
+        
+        if self.storage == "dominant":
+            return self._construct_next_dominant_height(pool)
+        
+        _prev_roots = self.root_system[self._constructed_height]
+        _next_height = self._constructed_height + 1
+        _clock = time.perf_counter()
         
-        while(self._constructed_height < max_height or max_height == 0):
-            _prev_roots = self.root_system[self._constructed_height]
-            _next_height = self._constructed_height + 1
+        # First determine all the possible new roots
+        if self.enumeration == "lattice":
+            self._add_lattice_roots(_next_height)
+        else:
+            for root in _prev_roots.values():
+                self._add_root_strings(root, self._constructed_height)
+            if self.enumeration == "check":
+                self._check_lattice_roots(_next_height)
+        
+        if _next_height > len(self.root_system) - 1:
+            # We did nothing, and thus reached the highest root
+				# Make a note that we constructed the root system fully, and return
+            self._fully_constructed = True
+            return False
+                        
+        # Calculate the co_mult and the mult for
+        # all the added roots at the first new height
+        _new_roots = self.root_system[_next_height]
+        self._count("candidates", len(_new_roots))
+        
+        # Drop the roots outside the region. The roots that are needed
+        # for the region are only added by roots that are needed as well.
+        if self._region_bounds is not None:
+            for key in [key for key, root in _new_roots.items() if not self._in_region(root.vector)]:
+                del _new_roots[key]
+        self._count("roots", len(_new_roots))
+        self._count("enumeration_seconds", time.perf_counter() - _clock)
             
-            # First determine all the possible new roots
-            for root in _prev_roots:
+        self._extend_co_mult_scale(_next_height)
+        _peterson_roots = []
+        _clock = time.perf_counter()
+        _reflection_seconds = 0.0
+        
+        for root in _new_roots.values():
+            # Determine the co_mult minus the root multiplicity
+            _co_mult = self._calculate_co_mult(root)
+            
+            # Real roots have multiplicity 1, they are the roots of positive norm
+            if root.mult == 0 and root.norm > 0:
+                root.mult = 1
+            
+            # Only calculate the mult is it hasn't been set before
+            if root.mult == 0:
+                # First try to get the multiplicity from another root in 
+					# this roots Weyl-orbit. We only need to do one simple Weyl-reflection 
+					# down, as all the roots below this height have been calculated before.
+
+					# First determine the first positive Dynkin label.
+					# We will do a simple Weyl reflection in this index later.
                 _dynkin_labels = self.algebra.root_to_weight(root.vector)
+                _reflect_index = 0
+                _can_reflect = False
+                for _reflect_index in range(self.rank):
+                    if _dynkin_labels[_reflect_index] > 0:
+                        _can_reflect = True
+                        break
                 
-                for i in range(self.rank):
-                    # Only do this for real simple roots.
-                    if self.algebra.cartan_matrix[i][i] <=0:
-                        continue
+                if _can_reflect:
+                    # We can reflect down, so do it
+                    _reflect_clock = time.perf_counter()
+                    _reflected_vector = self.algebra.simp_weyl_refl_root(root.vector, _reflect_index)
+                    # Get the multiplicity
+                    root.mult = self._get_root_mult_vector(_reflected_vector)
+                    _reflection_seconds += time.perf_counter() - _reflect_clock
+                    self._count("reflected", 1)
+                else:
+                    _peterson_roots.append(root)
                     
-                    # For every negative Dynkin label we can add 
-					# a (partial) root string to the root table
-                    if _dynkin_labels[i] >= 0:
-                        continue
+            root.co_mult = _co_mult
+        
+        self._count("co_mult_seconds", time.perf_counter() - _clock - _reflection_seconds)
+        self._count("reflection_seconds", _reflection_seconds)
+        
+        # Use the Peterson formula for the roots without a positive Dynkin label.
+        # Their multiplicities only depend on the lower heights.
+        _clock = time.perf_counter()
+        _mults = self._calculate_mults(_next_height, _peterson_roots, pool)
+        self._count("peterson_seconds", time.perf_counter() - _clock)
+            
+        for root, mult in zip(_peterson_roots, _mults):
+            root.mult = mult
+        
+        # Add the multiplicities to the co-multiplicities
+        for root in _new_roots.values():
+            root.co_mult += self.co_mult_scale * root.mult
+            
+        # Construct all the root multiples of the roots at the new height
+        _clock = time.perf_counter()
+        self._index_height(_next_height)
+        self._root_multiples.append(self._construct_root_multiples(_next_height))
+        self._count("multiples", len(self._root_multiples[_next_height]))
+        self._finish_height(_next_height)
+        self._count("multiples_seconds", time.perf_counter() - _clock)
+            
+        # Finally bump the constructed height number.
+        self._constructed_height += 1
+        
+        return True
+
+
+    def _construct_next_dominant_height(self, pool=None):
+        """
+        Construct the orbit representatives of the next height and calculate
+        their multiplicities. These are the vectors with connected support and
+        without a positive Dynkin label, which are all imaginary roots.
+        """
+
+        # A finite algebra has no imaginary roots, so the heights only
+        # go up to the height of the highest root
+        if self.algebra.finite and len(self._lattice_roots(self._constructed_height + 1)[0]) == 0:
+            self._fully_constructed = True
+            return False
+
+        _next_height = self._constructed_height + 1
+        self._extend_co_mult_scale(_next_height)
+        
+        _clock = time.perf_counter()
+        _vectors = self._dominant_vectors(_next_height)
+        self._count("candidates", len(_vectors))
+        self._count("roots", len(_vectors))
+        self._count("enumeration_seconds", time.perf_counter() - _clock)
+        
+        _clock = time.perf_counter()
+        _new_roots = {}
+        for vector in _vectors:
+            _root = Root(vector)
+            _root.norm = self.algebra.inner_product(_root, _root)
+            _root.co_mult = self._calculate_co_mult(_root)
+            _new_roots[_root.key] = _root
+        self._count("co_mult_seconds", time.perf_counter() - _clock)
+        
+        _clock = time.perf_counter()
+        _roots = list(_new_roots.values())
+        _mults = self._calculate_mults(_next_height, _roots, pool)
+        self._count("peterson_seconds", time.perf_counter() - _clock)
+        
+        for root, mult in zip(_roots, _mults):
+            root.mult = mult
+            root.co_mult += self.co_mult_scale * mult
+        
+        _clock = time.perf_counter()
+        while len(self.root_system) <= _next_height:
+            self.root_system.append({})
+        self.root_system[_next_height] = _new_roots
+        self._index_height(_next_height)
+        self._root_multiples.append({})
+        self._count("multiples_seconds", time.perf_counter() - _clock)
+        self._constructed_height += 1
+        
+        return True
+    
+    
+    def _add_lattice_roots(self, height):
+        """
+        Add the roots of a height to the root table, which are found
+        directly from the lattice vectors of that height.
+        
+        A positive vector of a hyperbolic algebra with connected support is
+        an imaginary root if and only if its norm is not positive (Kac,
+        Proposition 5.10). The vectors of positive norm are real roots if
+        the algebra recognizes them, see is_real_root. The height is only
+        added if it has any roots.
+        """
+        
+        _vectors, _norms = self._lattice_roots(height)
+        if len(_vectors) == 0:
+            return
+        
+        _new_roots = {}
+        for vector, key, norm in zip(_vectors, pack_vectors(_vectors).tolist(), _norms.tolist()):
+            _root = Root(vector)
+            _root.norm = norm
+            _new_roots[key] = _root
+        
+        while len(self.root_system) <= height:
+            self.root_system.append({})
+        self.root_system[height] = _new_roots
+    
+    
+    def _lattice_roots(self, height):
+        """
+        Return the root vectors of a height in the region of the construction
+        and their norms, see _add_lattice_roots.
+        """
+        
+        _vectors = self._lattice_vectors(height)
+        _norms = np.einsum("ij,jk,ik->i", _vectors, self.algebra.metric, _vectors)
+        _keep = (_norms <= self.algebra.max_real_norm()) & self._region_mask(_vectors)
+        
+        # The vectors of positive norm are only roots if they are real roots
+        for row in np.nonzero(_keep & (_norms > 0))[0]:
+            _keep[row] = self.algebra.is_real_root(_vectors[row].tolist())
+        
+        # Only the vectors with a vanishing component can have a disconnected support
+        for row in np.nonzero(_keep & (_norms <= 0) & np.any(_vectors == 0, axis=1))[0]:
+            _keep[row] = self._has_connected_support(_vectors[row])
+        
+        return _vectors[_keep], _norms[_keep]
+    
+    
+    def _check_lattice_roots(self, height):
+        """
+        Compare the roots of a height that were added by the root strings
+        with the lattice enumeration and issue a warning if they differ.
+        """
+        
+        _string_keys = set(self.root_system[height]) if height < len(self.root_system) else set()
+        _string_keys = {key for key in _string_keys if self._in_region(unpack_key(key, self.rank))}
+        _lattice_keys = set(pack_vectors(self._lattice_roots(height)[0]).tolist())
+        
+        for key in sorted(_string_keys - _lattice_keys):
+            print("WARNING: The root " + str(unpack_key(key, self.rank))
+                  + " of the root strings is missing in the lattice enumeration.")
+        for key in sorted(_lattice_keys - _string_keys):
+            print("WARNING: The lattice vector " + str(unpack_key(key, self.rank))
+                  + " is not reached by the root strings.")
+    
+    
+    def _dominant_vectors(self, height):
+        """
+        Return all positive vectors of a height that have a connected support
+        and no positive Dynkin label.
+        """
+        
+        _vectors = self._lattice_vectors(height)
+        _labels = np.dot(_vectors, self.algebra.cartan_matrix)
+        _vectors = _vectors[np.all(_labels[:, self._real_indices] <= 0, axis=1)]
+        
+        return [vector for vector in _vectors if self._has_connected_support(vector) and self._in_region(vector)]
+    
+    
+    def _lattice_vectors(self, height):
+        """Return all vectors with non-negative components of a height, sorted lexicographically."""
+        _vectors = np.indices((height + 1,) * (self.rank - 1)).reshape(self.rank - 1, -1).T
+        _vectors = _vectors[np.sum(_vectors, axis=1) <= height]
+        _vectors = np.column_stack((_vectors, height - np.sum(_vectors, axis=1)))
+        
+        return _vectors[np.lexsort(_vectors.T[::-1])]
+    
+    
+    def _has_connected_support(self, vector):
+        """Check if the support of a vector is a connected subdiagram of the Dynkin diagram."""
+        _support = [i for i in range(self.rank) if vector[i] != 0]
+        _reached = set(_support[:1])
+        _boundary = list(_reached)
+        
+        while _boundary:
+            i = _boundary.pop()
+            for j in _support:
+                if j not in _reached and self._cartan_rows[i][j] != 0:
+                    _reached.add(j)
+                    _boundary.append(j)
                     
-                    # The root string stops at \gamma = \beta + pMax \alpha_i,
+        return len(_reached) == len(_support)
+    
+    
+    def _expand_height(self, height):
+        """
+        Return all roots of a height in the dominant storage mode
+        as a Root_Layer by reflecting every possible root vector
+        to its orbit representative.
+        """
+        
+        _vectors, _norms = self._lattice_roots(height)
+        
+        _roots = []
+        for vector, norm in zip(_vectors, _norms.tolist()):
+            _mult = self._get_root_mult_vector(vector)
+            if _mult != 0:
+                _root = Root(vector)
+                _root.mult = _mult
+                _root.norm = norm
+                _roots.append(_root)
+                
+        return Root_Layer.from_roots(self.algebra, _roots)
+    
+    
+    def _calculate_mults(self, height, roots, pool=None, demand=False):
+        """
+        Calculate the multiplicities of roots of a height without a positive
+        Dynkin label, whose co_mult holds the co-multiplicity without their
+        own multiplicity. Returns the multiplicities in the order of the roots.
+        
+        Roots with a closed form in the algebra skip the Peterson formula,
+        unless the closed forms are checked against it.
+        
+        Keyword arguments:
+            height: The height of the roots
+            roots: The roots whose multiplicities are calculated
+            pool: An optional Peterson_Pool that evaluates the Peterson formula
+            demand: If True, the Peterson formula uses the co-multiplicities
+                    of _resolve_below
+        """
+        
+        _mults = [None] * len(roots)
+        if self.closed_forms != "off":
+            _mults = [self.algebra.closed_form_mult(root.vector) for root in roots]
+        
+        if self.closed_forms == "check":
+            _indices = list(range(len(roots)))
+        else:
+            _indices = [i for i in range(len(roots)) if _mults[i] is None]
+        _peterson_roots = [roots[i] for i in _indices]
+        self._count("closed_forms", sum(mult is not None for mult in _mults))
+        self._count("peterson_roots", len(_peterson_roots))
+        
+        if self.engine == "modular" and not demand:
+            # The modular engine works on whole arrays, so it does not need the pool
+            _peterson_mults = self._modular_peterson().calculate_mults(height, _peterson_roots)
+        elif pool is not None and len(_peterson_roots) >= pool.min_roots:
+            pool.ship(self)
+            _peterson_mults = pool.calculate_mults(height, _peterson_roots)
+            for metric, amount in pool.counters.items():
+                self._count(metric, amount)
+        else:
+            _peterson_mults = [self._calculate_mult(root, root.co_mult, demand) for root in _peterson_roots]
+            
+        for i, mult in zip(_indices, _peterson_mults):
+            # Issue a warning if the closed form does not agree with the Peterson formula
+            if _mults[i] is not None and _mults[i] != mult:
+                print("WARNING: Closed form mult of root " + str(roots[i].vector) + " is "
+                      + str(_mults[i]) + " but the Peterson formula gives " + str(mult) + ".")
+            _mults[i] = mult
+            
+        return _mults
+    
+    
+    def _add_root_strings(self, root, height, min_height=0):
+        """
+        Add the (partial) root strings that start at a root to the root table.
+        
+        Keyword arguments:
+            root: The root at which the root strings start
+            height: The height of the root
+            min_height: Only add roots above this height
+        """
+        
+        _dynkin_labels = self.algebra.root_to_weight(root.vector)
+        
+        for i in range(self.rank):
+            # Only do this for real simple roots.
+            if self.algebra.cartan_matrix[i][i] <=0:
+                continue
+            
+            # For every negative Dynkin label we can add 
+					# a (partial) root string to the root table
+            if _dynkin_labels[i] >= 0:
+                continue
+            
+            # The root string stops at \gamma = \beta + pMax \alpha_i,
 					# with \gamma being the new root, \beta the old, and
 					# pMax equal to -p_i
-                    _p_max = -1 * _dynkin_labels[i]
-                    
-                    for j in range(1, _p_max + 1):
-                        if len(self.root_system) - 1 < self._constructed_height + j:
-                            # This will be the first time this height will be reached,
-                            # so create a new container for these roots
-                            self.root_system.insert(self._constructed_height + j, set())
-
-                        _new_vector = root.vector.copy()
-                        _new_vector[i] =  _new_vector[i] + j
-                        _new_root = Root(_new_vector)
-                        _new_height = self._constructed_height + j
-                        
-                        if j == _p_max:
-                            # This is the Weyl reflection of the old root
-                            # Thus they have the same multiplicity
-                            _new_root.mult = root.mult
-                            # The other multiplicities will be calculated below
-                            
-                        #  Add the new root to the root table if it isn't there already
-                        _new_roots = self.root_system[_new_height]
-                        
-                        if _new_root not in _new_roots:
-                            _new_root.norm = self.algebra.inner_product(_new_root, _new_root)
-                            _new_roots.add(_new_root)
+            _p_max = -1 * _dynkin_labels[i]
             
-            if _next_height > len(self.root_system) - 1:
-                # We did nothing, and thus reached the highest root
-				# Make a note that we constructed the root system fully, and return
-                self._fully_constructed = True
-                return
-                            
-            # Calculate the co_mult and the mult for
-            # all the added roots at the first new height
-            _new_roots = self.root_system[_next_height]
-            
-            for root in _new_roots:
-                # Determine the co_mult minus the root multiplicity
-                _co_mult = self._calculate_co_mult(root)
+            for j in range(1, _p_max + 1):
+                if height + j <= min_height:
+                    continue
                 
-                # Only calculate the mult is it hasn't been set before
-                if root.mult == 0:
-                    # First try to get the multiplicity from another root in 
-					# this roots Weyl-orbit. We only need to do one simple Weyl-reflection 
-					# down, as all the roots below this height have been calculated before.
+                while len(self.root_system) - 1 < height + j:
+                    # This will be the first time this height will be reached,
+                    # so create a new container for these roots
+                    self.root_system.append({})
 
-					# First determine the first positive Dynkin label.
-					# We will do a simple Weyl reflection in this index later.
-                    _dynkin_labels = self.algebra.root_to_weight(root.vector)
-                    _reflect_index = 0
-                    _can_reflect = False
-                    for _reflect_index in range(self.rank):
-                        if _dynkin_labels[_reflect_index] > 0:
-                            _can_reflect = True
-                            break
+                _new_key = root.key + j * self._simple_keys[i]
+                _new_height = height + j
                     
-                    if _can_reflect:
-                        # We can reflect down, so do it
-                        _reflected_vector = self.algebra.simp_weyl_refl_root(root.vector, _reflect_index)
-                        # Get the multiplicity
-                        root.mult = self._get_root_mult_vector(_reflected_vector)
-                    else:
-                        root.mult = self._calculate_mult(root, _co_mult)
-                        
-                root.co_mult = _co_mult + Fraction(root.mult)
+                #  Add the new root to the root table if it isn't there already
+                _new_roots = self.root_system[_new_height]
                 
-            # Construct all the root multiples of the roots at the new height
-            _multiples_list = []
-            for i in range(1, int(np.floor(_next_height / 2) + 1)):
-                # We're only interested in i's with zero divisor
-                if _next_height % i != 0:
-                    continue
-                        
-                _factor = _next_height // i
-                _roots = self.root_system[i]
+                if _new_key not in _new_roots:
+                    _new_vector = root.vector.copy()
+                    _new_vector[i] =  _new_vector[i] + j
+                    _new_root = Root(_new_vector)
                     
-                for root in _roots:
-                    _root_multiple = root.times(_factor)
-                    # Don't add it if it's already in the 'proper' root list
-                    # Else we would count this one double
-                    if _root_multiple in _new_roots:
-                        continue
-
-                    _root_multiple.co_mult = self._calculate_co_mult(_root_multiple)
-                    _multiples_list.append(_root_multiple)
-                        
-                        
-            self._root_multiples.insert(_next_height, _multiples_list)
+                    if j == _p_max:
+                        # This is the Weyl reflection of the old root
+                        # Thus they have the same multiplicity
+                        _new_root.mult = root.mult
+                        # The other multiplicities will be calculated below
+                    
+                    _new_root.norm = self.algebra.inner_product(_new_root, _new_root)
+                    _new_roots[_new_key] = _new_root
+    
+    
+    def _index_height(self, height, min_primitive_height=0):
+        """
+        Add the roots of a height with their final multiplicities to the
+        multiple index, if the height of their primitive vector is above
+        min_primitive_height and within the limit of the index.
+        """
+        
+        while len(self._primitive_keys) <= height:
+            self._primitive_keys.append([])
+        
+        for root in self.root_system[height].values():
+            if root.mult == 0:
+                continue
+            
+            _vector = root.vector.tolist()
+            _gcd = math.gcd(*_vector)
+            if height // _gcd <= min_primitive_height:
+                continue
+            if self._index_limit is not None and height // _gcd > self._index_limit:
+                continue
+            _primitive_key = pack_vector([x // _gcd for x in _vector])
+            
+            _multiples = self._multiple_index.get(_primitive_key)
+            if _multiples is None:
+                _multiples = self._multiple_index[_primitive_key] = {}
+                self._primitive_keys[height // _gcd].append(_primitive_key)
+            _multiples[_gcd] = root.mult
+    
+    
+    def _limit_index(self, max_height):
+        """
+        Only index the primitive vectors up to half of a height of the
+        construction. The primitive vectors that are missing below the
+        new limit are indexed again from the finished heights.
+        """
+        
+        _limit = None if max_height == 0 else max_height // 2
+        _old_limit = self._index_limit
+        if _old_limit is not None and (_limit is None or _limit > _old_limit):
+            self._index_limit = _limit
+            for height in range(_old_limit + 1, self._constructed_height + 1):
+                self._index_height(height, _old_limit)
+        elif _old_limit is None and _limit is not None:
+            # Drop the primitive vectors above the limit
+            self._index_limit = _limit
+            for keys in self._primitive_keys[_limit + 1:]:
+                for key in keys:
+                    del self._multiple_index[key]
+                keys.clear()
+    
+    
+    def _construct_root_multiples(self, height):
+        """
+        Construct all the root multiples of the roots at a height,
+        i.e. the multiples of lower roots that are not roots themselves.
+        
+        A vector n * p of a primitive vector p is a root multiple if it is
+        not a root, but k * p is a root for a true divisor k of n. So only
+        the primitive vectors whose height divides the height are visited.
+        The roots of the height have to be in the multiple index already.
+        """
+        
+        _multiples_list = {}
+        for primitive_height in _divisors(height)[:-1]:
+            _factor = height // primitive_height
+            
+            for primitive_key in self._primitive_keys[primitive_height]:
+                _multiples = self._multiple_index[primitive_key]
+                
+                # Don't add it if it's a root, else we would count it double
+                if _factor in _multiples or not any(_factor % k == 0 for k in _multiples):
+                    continue
                 
-            # Finally bump the constructed height number.
-            self._constructed_height += 1
+                _vector = unpack_key(primitive_key, self.rank) * _factor
+                
+                # Nothing in the region needs multiples outside of it
+                if not self._in_region(_vector):
+                    continue
+                
+                _root_multiple = Root(_vector)
+                _root_multiple.norm = self.algebra.inner_product(_root_multiple, _root_multiple)
+                _root_multiple.co_mult = self._divisor_co_mult(_vector.tolist())
+                _multiples_list[_root_multiple.key] = _root_multiple
+
+        return _multiples_list
 
 
     ################################       
@@ -299,20 +1533,39 @@ class Root_System:
         """
         Calculates the "co-multiplicity", i.e. the fractional sum of multiplicities
         of all fractional roots. Used in the Peterson formula.
-        """
         
-        _co_mult = Fraction(0)
+        The result is an integer, namely the co-multiplicity times co_mult_scale.
+        """
         
         # There are no root multiples if the root is real
         if root.norm > 0:
-            return _co_mult
+            return 0
         
-        for i in range(2, root.highest() + 1):
-            _div_root = root.div(i)
+        return self._divisor_co_mult(root.vector.tolist())
+    
+    
+    def _divisor_co_mult(self, vector):
+        """
+        Return the co-multiplicity of a vector, given as a list, without its
+        own multiplicity, times co_mult_scale.
+        
+        Only the divisors of the gcd of the components can divide the vector,
+        and the multiplicities of the divided vectors are taken from the
+        multiple index of their primitive vector.
+        """
+        
+        _gcd = math.gcd(*vector)
+        if _gcd == 1:
+            return 0
+        
+        _multiples = self._multiple_index.get(pack_vector([x // _gcd for x in vector]))
+        if _multiples is None:
+            return 0
+        
+        _co_mult = 0
+        for i in _divisors(_gcd)[1:]:
+            _co_mult += _multiples.get(_gcd // i, 0) * (self.co_mult_scale // i)
             
-            if _div_root is not None:
-                _co_mult += Fraction(self._get_root_mult(_div_root),i)
-                
         return _co_mult
                     
                                         
@@ -320,44 +1573,112 @@ class Root_System:
     # Calculates the multiplicity of a root.
     # Based on the Peterson formula. Note that it is necessary to give the co-multiplicity
 	# in advance.
-    def _calculate_mult(self, root, co_mult):
+    def _calculate_mult(self, root, co_mult, demand=False):
         """
         Calculates the multiplicity of a root.
         Based on the Peterson formula. 
         Note that it is necessary to give the co-multiplicity in advance.
+        With demand the co-multiplicities below the root are taken from the
+        arrays of _resolve_below.
+        
+        The Peterson sum is computed with the integer co-multiplicities,
+        so it is co_mult_scale^2 times the actual sum and the division
+        at the end is exact.
         """
   
-        _multiplicity = Fraction(0)
+        _multiplicity = 0
         
-        # We split the Peterson formula into two symmetric halves
-		# plus a remainder if the root height is even
-        _half_height = int(np.ceil(root.height() / 2))
-        
-        for i in range(1, _half_height):
-            _multiplicity += self._peterson_part(root, i)
+        if demand:
+            _multiplicity = self._peterson_box_sum(root)
+        elif self.engine == "modular":
+            # The modular engine finds the multiplicity without the co-multiplicity
+            return self._modular_peterson().calculate_mults(root.height(), [root])[0]
+        elif self.engine == "denominator":
+            return self._denominator_mult(root, co_mult)
+        elif self.storage == "dominant":
+            # Only the orbit representatives are stored,
+            # so sum over the lattice instead of the heights
+            _multiplicity = self._peterson_lattice_sum(root)
+        else:
+            # We split the Peterson formula into two symmetric halves
+            # plus a remainder if the root height is even
+            _half_height = int(np.ceil(root.height() / 2))
             
-        _multiplicity *= 2
-        
-        if root.height() % 2 == 0:
-            _multiplicity += self._peterson_part(root, root.height()//2)
+            for i in range(1, _half_height):
+                _multiplicity += self._peterson_part(root, i)
+                
+            _multiplicity *= 2
+            
+            if root.height() % 2 == 0:
+                _multiplicity += self._peterson_part(root, root.height()//2)
             
-        _multiplicity *= Fraction(1,self.algebra.inner_product(root, root) - (2 * self.algebra.rho(root)))
-        _multiplicity -= co_mult
+        _denominator = self.algebra.inner_product(root, root) - (2 * self.algebra.rho(root))
+        _multiplicity -= co_mult * self.co_mult_scale * _denominator
+        _multiplicity, _remainder = divmod(_multiplicity, self.co_mult_scale**2 * _denominator)
         
         # Issue a warning if the multiplicity is not an integer.
-        # This usually happens as soon as one of the co-multiplicities
-        # is of the order 2^64.
-        # At the moment there is no fix for this.
-        # One should not trust the root system for heights at which
-        # the warning message is issued.
-        # Currently this height is 84.
-        if not _multiplicity.is_integer():
-            print("WARNING: Mult of root " + str(root.vector) + " is not an int but " + str(_multiplicity) + "." )
+        # Since all numbers are arbitrary-precision integers this only
+        # happens if the root table is inconsistent.
+        if _remainder != 0:
+            print("WARNING: Mult of root " + str(root.vector) + " is not an int but " 
+                  + str(_multiplicity + Fraction(_remainder, self.co_mult_scale**2 * _denominator)) + "." )
         
         # Return the multiplicity as an integer
-        return round(_multiplicity)
+        return _multiplicity
                 
 
+    def _denominator_mult(self, root, co_mult):
+        """
+        Calculate the multiplicity of a root from the Weyl-Kac denominator identity.
+        
+        The logarithm of the identity says that the co-multiplicities c are
+        the coefficients of -log(D), where D is the sum over the Weyl group
+        of the identity. Comparing the coefficients of the derivative by the
+        height gives for a vector beta with D_0 = 1
+            ht(beta) c(beta) = -ht(beta) D_beta - sum_gamma ht(gamma) c(gamma) D_(beta - gamma),
+        where gamma runs over the vectors between 0 and beta. Since D only has
+        a few terms, only a few co-multiplicities below the root are needed.
+        
+        Like in the Peterson formula all co-multiplicities are integers,
+        namely the co-multiplicities times co_mult_scale.
+        """
+        
+        _vector = root.vector.tolist()
+        _height = sum(_vector)
+        _deltas, _signs = self.algebra.weyl_denominator(_height)
+        _keep = np.all(_deltas <= _vector, axis=1)
+        self._count("pairs_scanned", len(_deltas))
+        self._count("pairs_matched", int(np.sum(_keep)))
+        self._count("products", int(np.sum(_keep)))
+        
+        _sum = 0
+        for delta, sign in zip(_deltas[_keep].tolist(), _signs[_keep].tolist()):
+            _gamma = [x - y for x, y in zip(_vector, delta)]
+            _gamma_height = sum(_gamma)
+            if _gamma_height == 0:
+                _sum += sign * _height * self.co_mult_scale
+            else:
+                _sum += sign * _gamma_height * self._lattice_co_mult(_gamma)
+        
+        _co_mult, _remainder = divmod(-_sum, _height)
+        _multiplicity, _mult_remainder = divmod(_co_mult - co_mult, self.co_mult_scale)
+        
+        # Issue a warning if the multiplicity is not an integer, which
+        # only happens if the root table is inconsistent
+        if _remainder != 0 or _mult_remainder != 0:
+            print("WARNING: Mult of root " + str(root.vector) + " is not an int but "
+                  + str(Fraction(-_sum, _height * self.co_mult_scale) - Fraction(co_mult, self.co_mult_scale)) + ".")
+        
+        return _multiplicity
+    
+    
+    def _modular_peterson(self):
+        """Return the residues of the modular Peterson engine."""
+        if self._modular is None:
+            self._modular = Modular_Peterson(self)
+        return self._modular
+    
+    
     def _peterson_part(self, root, height):
         """
         Calculate a part of the Peterson formula.
@@ -366,6 +1687,9 @@ class Root_System:
         of one of the decomposition parts.
         """
         
+        if self.engine == "join":
+            return self._peterson_join_part(root, height)
+        
         _betas = self.root_system[height]
         _gammas = self.root_system[root.height() - height]
 
@@ -394,17 +1718,197 @@ class Root_System:
                     of the Peterson formula.
         """
         
-        _multiplicity = Fraction(0)
-        for beta in list_1:
-            for gamma in list_2:
+        _multiplicity = 0
+        _matched = 0
+        for beta in list_1.values():
+            for gamma in list_2.values():
                 for i in range(self.rank):
                     if beta.vector[i] + gamma.vector[i] != root.vector[i]:
                         break
                 else:
                     _part = (beta.co_mult) * (gamma.co_mult)
-                    _part *= Fraction(self.algebra.inner_product(beta, gamma))
+                    _part *= self.algebra.inner_product(beta, gamma)
                     _multiplicity += _part
+                    _matched += 1
 
+        self._count("pairs_scanned", len(list_1) * len(list_2))
+        self._count("pairs_matched", _matched)
+        self._count("products", _matched)
+        
         return _multiplicity
-
-
+    
+    
+    def _peterson_join_part(self, root, height):
+        """
+        Calculate the same part of the Peterson formula as _peterson_part,
+        but instead of comparing all pairs of roots look up gamma = root - beta
+        in the dictionaries of the complementary height.
+        """
+        
+        if self.storage == "compact":
+            return self._peterson_layer_join_part(root, height)
+        
+        _gamma_height = root.height() - height
+        _gammas = self.root_system[_gamma_height]
+        _gamma_multiples = self._root_multiples[_gamma_height]
+        
+        _multiplicity = 0
+        _matched = 0
+        for betas in (self.root_system[height], self._root_multiples[height]):
+            self._count("pairs_scanned", len(betas))
+            for beta_key, beta in betas.items():
+                # The difference of the keys is the key of gamma.
+                # It never matches if gamma has a negative component.
+                _gamma_key = root.key - beta_key
+                gamma = _gammas.get(_gamma_key)
+                if gamma is None:
+                    gamma = _gamma_multiples.get(_gamma_key)
+                    if gamma is None:
+                        continue
+                _part = (beta.co_mult) * (gamma.co_mult)
+                _part *= self.algebra.inner_product(beta, gamma)
+                _multiplicity += _part
+                _matched += 1
+        
+        self._count("pairs_matched", _matched)
+        self._count("products", _matched)
+                
+        return _multiplicity
+    
+    
+    def _peterson_layer_join_part(self, root, height):
+        """
+        Calculate the same part of the Peterson formula as _peterson_join_part
+        for compact layers. The partners of all betas of a layer are looked up
+        at once and only the matching pairs are summed up in Python.
+        """
+        
+        _gamma_height = root.height() - height
+        _multiplicity = 0
+        
+        for betas in (self.root_system[height], self._root_multiples[height]):
+            if len(betas) == 0:
+                continue
+            
+            _gamma_keys = root.key - betas.keys
+            
+            for gammas in (self.root_system[_gamma_height], self._root_multiples[_gamma_height]):
+                _gamma_rows = gammas.find_all(_gamma_keys)
+                _beta_rows = np.nonzero(_gamma_rows >= 0)[0]
+                self._count("pairs_scanned", len(_gamma_keys))
+                self._count("pairs_matched", len(_beta_rows))
+                self._count("products", len(_beta_rows))
+                if len(_beta_rows) == 0:
+                    continue
+                _gamma_rows = _gamma_rows[_beta_rows]
+                
+                # The inner products of all matching pairs
+                _inner_products = np.einsum("ij,jk,ik->i", betas.vectors[_beta_rows],
+                                            self.algebra.metric, gammas.vectors[_gamma_rows])
+                
+                for beta_co_mult, gamma_co_mult, inner_product in zip(betas.co_mults[_beta_rows],
+                                                                      gammas.co_mults[_gamma_rows],
+                                                                      _inner_products.tolist()):
+                    _multiplicity += beta_co_mult * gamma_co_mult * inner_product
+                    
+        return _multiplicity
+    
+    
+    def _peterson_lattice_sum(self, root):
+        """
+        Calculate the r.h.s of the Peterson formula in the dominant storage mode.
+        
+        Since only the orbit representatives are stored, the sum runs over all
+        lattice vectors beta between 0 and the root. The co-multiplicities of
+        all these vectors are found once, see _box_co_mults. Since gamma = root - beta
+        runs over the same box in reversed order, its co-multiplicities are the
+        reversed array.
+        """
+        
+        _vector = root.vector.astype(np.int64)
+        _betas = np.indices(tuple(_vector + 1)).reshape(self.rank, -1).T
+        _heights = np.sum(_betas, axis=1)
+        _inside = (_heights > 0) & (_heights < root.height())
+        
+        _co_mults = self._box_co_mults(_betas, _inside)
+        _gamma_co_mults = _co_mults[::-1]
+        _keep = _inside & (_co_mults != 0) & (_gamma_co_mults != 0)
+        self._count("pairs_scanned", len(_betas))
+        self._count("pairs_matched", int(np.sum(_keep)))
+        self._count("products", int(np.sum(_keep)))
+        
+        _betas = _betas[_keep]
+        _inner_products = np.einsum("ij,jk,ik->i", _betas, self.algebra.metric, _vector - _betas)
+        
+        return int(np.sum(_co_mults[_keep] * _gamma_co_mults[_keep] * _inner_products.astype(object)))
+    
+    
+    def _box_co_mults(self, vectors, inside):
+        """
+        Return the co-multiplicities of an array of positive vectors times
+        co_mult_scale as an object array, which is 0 where inside is False.
+        
+        Vectors that can not be roots or multiples of real roots are discarded
+        by their norm. Real roots are not looked up but recognized: real roots
+        are primitive vectors, so a vector of positive norm is k times a real
+        root if k is the gcd of its components and the vector divided by k is
+        a real root. Its co-multiplicity is 1 / k. Only the co-multiplicities
+        of the imaginary vectors are looked up.
+        """
+        
+        _co_mults = np.zeros(len(vectors), dtype=object)
+        _norms = np.einsum("ij,jk,ik->i", vectors, self.algebra.metric, vectors)
+        _candidates = inside & self._may_have_co_mult(_norms)
+        
+        _real = np.nonzero(_candidates & (_norms > 0))[0]
+        _factors = np.gcd.reduce(vectors[_real], axis=1)
+        for row, factor in zip(_real.tolist(), _factors.tolist()):
+            if self.algebra.is_real_root((vectors[row] // factor).tolist()):
+                _co_mults[row] = self.co_mult_scale // factor
+        
+        _imaginary = np.nonzero(_candidates & (_norms <= 0))[0]
+        for row, key in zip(_imaginary.tolist(), pack_vectors(vectors[_imaginary]).tolist()):
+            _co_mult = self._co_mult_cache.get(key)
+            _co_mults[row] = _co_mult if _co_mult is not None else self._lattice_co_mult(vectors[row].tolist())
+            
+        return _co_mults
+    
+    
+    def _may_have_co_mult(self, norms):
+        """
+        Check which norms belong to possible roots or multiples of real roots.
+        Imaginary roots have a norm of at most 0 and a multiple k * alpha of
+        a real root has the norm k^2 times the norm of a simple root.
+        """
+        
+        _possible = norms <= 0
+        for real_norm in np.unique(np.diag(self.algebra.metric)).tolist():
+            _squares = norms // real_norm
+            _roots = np.round(np.sqrt(np.maximum(_squares, 0))).astype(np.int64)
+            _possible |= (norms > 0) & (norms % real_norm == 0) & (_roots * _roots == _squares)
+        
+        return _possible
+    
+    
+    def _lattice_co_mult(self, vector):
+        """
+        Return the co-multiplicity of an arbitrary positive vector, given as a list,
+        times co_mult_scale. The values are cached until the cache is full.
+        """
+        
+        _key = pack_vector(vector)
+        _co_mult = self._co_mult_cache.get(_key)
+        
+        if _co_mult is None:
+            _co_mult = 0
+            _gcd = math.gcd(*vector)
+            for i in range(1, _gcd + 1):
+                if _gcd % i == 0:
+                    _divided = [x // i for x in vector]
+                    _co_mult += self._get_root_mult_key(pack_vector(_divided), sum(_divided)) * (self.co_mult_scale // i)
+                    
+            if len(self._co_mult_cache) >= self._CO_MULT_CACHE_SIZE:
+                self._co_mult_cache.clear()
+            self._co_mult_cache[_key] = _co_mult
+            
+        return _co_mult
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+# This file is part of VisualLie.
+#
+# Copyright (C) 2024 Hannes Malcha
+#
+# VisualLie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# VisualLie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VisualLie.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+VisualLie is a web app to visualize the root system of the Feingold-Frenkel
+algebra.
+
+This class is part of the rootsystem package that constructs the root system
+of the Feingold-Frenkel algebra up to a given height.
+
+This class writes the root table height by height while it is constructed.
+"""
+
+import os
+import queue
+import threading
+
+
+class Root_Writer:
+    """
+    A class that streams the roots of finished heights to a text file.
+
+    Every row of the file holds a root vector followed by its multiplicity,
+    separated by commas. The multiplicities are written as decimal Python
+    ints, so they stay exact beyond 64 bits. Lines that start with "#"
+    record the construction, e.g. its region, and hold no roots.
+
+    The rows are first written to a file with the suffix ".part", which
+    replaces the actual file when the writer is closed. If the construction
+    fails, the partial file holds all heights written so far and can be
+    used to resume the construction.
+
+    Attributes:
+        file_path_and_name: The file that is written
+        background: Whether the rows are written by a background thread
+        height: The largest height written so far, -1 if none
+    """
+
+
+    def __init__(self, file_path_and_name, background=False):
+        """
+        Open the file for writing.
+
+        Keyword arguments:
+            file_path_and_name: The file that is written
+            background: If True, the rows are formatted and written by a
+                        background thread, such that the construction
+                        continues while a height is written
+        """
+
+        self.file_path_and_name = file_path_and_name
+        self.background = background
+        self.height = -1
+
+        self._part_path = file_path_and_name + ".part"
+        self._file = open(self._part_path, "w")
+        self._error = None
+
+        if background:
+            # Only keep a few heights in the queue, such that the
+            # construction waits if the file can not keep up
+            self._queue = queue.Queue(maxsize=4)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, error_type, error, traceback):
+        self.close(error_type is None)
+
+
+    def write_height(self, height, vectors, mults):
+        """
+        Write the roots of a height.
+
+        Keyword arguments:
+            height: The height of the roots
+            vectors: The root vectors as an array, one per row
+            mults: The multiplicities of the roots
+        """
+
+        self.height = height
+
+        if not self.background:
+            self._write_rows(vectors, mults)
+            return
+
+        self._raise_error()
+        self._queue.put((vectors, mults))
+
+
+    def write_comment(self, text):
+        """Write a line that starts with "#" and holds no roots."""
+
+        _line = "# " + text + "\n"
+
+        if not self.background:
+            self._file.write(_line)
+            return
+
+        self._raise_error()
+        self._queue.put(_line)
+
+
+    def close(self, complete=True):
+        """
+        Write the remaining heights and close the file.
+
+        Keyword arguments:
+            complete: If True, the written file replaces the actual file.
+                      Otherwise the partial file is kept as it is.
+        """
+
+        if self._file.closed:
+            return
+
+        if self.background:
+            self._queue.put(None)
+            self._thread.join()
+
+        self._file.close()
+        self._raise_error()
+
+        if complete:
+            os.replace(self._part_path, self.file_path_and_name)
+
+
+    def _write_rows(self, vectors, mults):
+        """Format the rows of a height and write them at once."""
+        _rows = [",".join(map(str, vector)) + "," + str(mult) + "\n"
+                 for vector, mult in zip(vectors.tolist(), mults)]
+        self._file.write("".join(_rows))
+
+
+    def _run(self):
+        """The main loop of the background thread."""
+        for item in iter(self._queue.get, None):
+            # After an error only empty the queue, the error is
+            # raised in the constructing thread
+            if self._error is not None:
+                continue
+            try:
+                if isinstance(item, str):
+                    self._file.write(item)
+                else:
+                    self._write_rows(*item)
+            except Exception as error:
+                self._error = error
+
+
+    def _raise_error(self):
+        """Raise an error of the background thread in the calling thread."""
+        if self._error is not None:
+            _error, self._error = self._error, None
+            raise _error